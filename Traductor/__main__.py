@@ -1,6 +1,11 @@
+import sys
 from modules.properties import set_main_directory
 set_main_directory(__file__)
 
+if len(sys.argv) > 1:
+    from modules.cli import main
+    sys.exit(main())
+
 from modules.gui import MainApp
 app = MainApp()
 app.mainloop()
@@ -1,18 +1,20 @@
-from tkinter import messagebox
 import os
 import shutil
 from .properties import *
+from .stf_document import split_line, is_flow_key, get_flow_name, build_index, ENTRY, NO_FLOW_VERSION
 
 logger = get_logger(__file__)
+trace = TraceSampler(logger)
 
 def filter_and_clean_lines(input_file):
+    trace.reset()
     logger.debug(f"Abriendo el archivo: {input_file}")
     with open(input_file, "r", encoding=ENCODING) as file:
         lines = file.readlines()
     original_lines = len(lines)
     filtered_lines = []
-    flow_lines = []
     last_flow_version = {}
+    flow_line_versions = []
     unique_keys = set()
     duplicated_lines = []
     untranslatable_lines = []
@@ -20,8 +22,9 @@ def filter_and_clean_lines(input_file):
     logger.debug(f"Total de líneas leídas: {original_lines}")
 
     for line in lines:
-        parts = line.split("\t", 1)
-        key = parts[0]
+        kind, key, flow_version = split_line(line)
+        if kind != ENTRY:
+            key = line
 
         if line.rstrip():
             if key in unique_keys:
@@ -33,36 +36,34 @@ def filter_and_clean_lines(input_file):
                 untranslatable_lines.append(line)
                 continue
 
-        if line.lower().startswith("flow"):
-            flow_lines.append(line)
-            flow_key_parts = key.split(".")
-            flow_key = ".".join(flow_key_parts[0:3])
-            logger.debug(f"Procesando línea de flujo: {key}")
+        if flow_version != NO_FLOW_VERSION or kind == ENTRY and is_flow_key(key):
+            flow_key = get_flow_name(key)
+            trace.trace("líneas de flujo", "Procesando línea de flujo: %s", key)
 
-            if not flow_key_parts[3].isdigit():
+            if flow_version == NO_FLOW_VERSION:
                 filtered_lines.append(line)
-                logger.debug(f"Versión de flujo no numérica detectada, línea agregada directamente: {line.strip()}")
+                trace.trace("versiones de flujo no numéricas", "Versión de flujo no numérica detectada, línea agregada directamente: %s", line.rstrip())
                 continue
 
-            flow_version = int(flow_key_parts[3])
+            flow_line_versions.append((line, flow_key, flow_version))
             if not (flow_key in last_flow_version and flow_version <= last_flow_version[flow_key]):
                 last_flow_version[flow_key] = flow_version
-                logger.debug(f"Actualizando última versión del flujo {flow_key} a {flow_version}")
+                trace.trace("actualizaciones de versión de flujo", "Actualizando última versión del flujo %s a %s", flow_key, flow_version)
         else:
             filtered_lines.append(line)
-            logger.debug(f"Línea no relacionada con flujos, agregada directamente: {line.strip()}")
+            trace.trace("líneas no relacionadas con flujos", "Línea no relacionada con flujos, agregada directamente: %s", line.rstrip())
 
-    for key, version in last_flow_version.items():
-        key_with_version = key + "." + str(version)
-        for line in flow_lines:
-            if key_with_version in line:
-                filtered_lines.append(line)
-                logger.debug(f"Línea de flujo con la versión más reciente agregada: {line.strip()}")
+    for line, flow_key, flow_version in flow_line_versions:
+        if flow_version == last_flow_version[flow_key]:
+            filtered_lines.append(line)
+            trace.trace("líneas de flujo con la versión más reciente", "Línea de flujo con la versión más reciente agregada: %s", line.rstrip())
 
     logger.debug(f"Escribiendo {len(filtered_lines)} líneas filtradas en el archivo: {SOURCE_FILE_PATH}")
     with open(SOURCE_FILE_PATH, "w", encoding=ENCODING) as file:
         file.writelines(filtered_lines)
+    build_index(SOURCE_FILE_PATH, filtered_lines)
     
+    trace.summary("Resumen de la limpieza")
     logger.info(f"Filtradas {original_lines - len(filtered_lines)}/{original_lines} líneas de {input_file} a {SOURCE_FILE_PATH}")
 
     if duplicated_lines:
@@ -75,18 +76,27 @@ def filter_and_clean_lines(input_file):
             file.writelines(untranslatable_lines)
             logger.info(f"Guardadas {len(untranslatable_lines)} líneas no traducibles en {UNTRANSLATABLE_LINES_FILE_PATH}")
 
-def clean_file(input_file):
+def show_message(interactive, level, title, message):
+    if not interactive:
+        return
+    from tkinter import messagebox
+    if level == "warning":
+        messagebox.showwarning(title, message)
+    else:
+        messagebox.showinfo(title, message)
+
+def clean_file(input_file, interactive=True):
     if os.path.exists(STATE_FILE):
         logger.warning(f"El archivo {STATE_FILE} ya existe. Se omite este proceso")
-        messagebox.showinfo("Información", f"El archivo {STATE_FILE} ya existe. Se omite este proceso")
+        show_message(interactive, "info", "Información", f"El archivo {STATE_FILE} ya existe. Se omite este proceso")
         return True
 
     if not input_file:
-        messagebox.showwarning("Advertencia", "No se ha seleccionado ningún archivo.")
+        show_message(interactive, "warning", "Advertencia", "No se ha seleccionado ningún archivo.")
         logger.debug("No se ha seleccionado ningún archivo.")
         return False
 
-    if not os.path.samefile(input_file, SOURCE_FILE_PATH):
+    if not os.path.exists(SOURCE_FILE_PATH) or not os.path.samefile(input_file, SOURCE_FILE_PATH):
         shutil.copy(input_file, SOURCE_FILE_PATH)
     logger.debug(f"Archivo .stf preparado: {input_file}")
 
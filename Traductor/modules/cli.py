@@ -0,0 +1,121 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+from . import properties
+
+EXIT_OK = 0
+EXIT_INVALID_INPUT = 1
+EXIT_CLEAN_FAILED = 3
+EXIT_INCREMENTAL_FAILED = 7
+EXIT_GENERATE_FAILED = 4
+EXIT_EXPORT_FAILED = 5
+EXIT_PROCESS_FAILED = 6
+EXIT_UNEXPECTED_ERROR = 8
+EXIT_INCOMPLETE = 9
+EXIT_INTERRUPTED = 130
+
+class ConsoleProgress:
+    class Value:
+        def __init__(self):
+            self.value = 0
+
+        def get(self):
+            return self.value
+
+    def __init__(self):
+        self.progress = self.Value()
+        self.start_time = time.time()
+
+    def update(self, value, text):
+        self.progress.value = value
+        print(f"[{time.time() - self.start_time:8.1f}s] {value:5.1f}% {text}", flush=True)
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(prog="Traductor", description="Traduce un archivo .stf de Salesforce sin interfaz gráfica.")
+    parser.add_argument("input", nargs="?", help="Archivo .stf exportado del Translation Workbench")
+    parser.add_argument("-o", "--output", help="Directorio donde se guardan los archivos traducidos")
+    parser.add_argument("-w", "--work-dir", help="Directorio para los archivos intermedios. Permite lanzar varias ejecuciones en paralelo")
+    parser.add_argument("--resume", action="store_true", help="Reanuda los batches de una ejecución anterior en el directorio de trabajo")
+    parser.add_argument("-p", "--previous", help="Directorio (por ejemplo una copia de seguridad) con el Source y el Translated de la ejecución anterior. Solo se traducen las keys nuevas o modificadas")
+    arguments = parser.parse_args(argv)
+    if not arguments.resume and not arguments.input:
+        parser.error("Se debe indicar el archivo .stf de entrada o --resume")
+    return arguments
+
+def is_in_directory(file_path, directory):
+    return os.path.commonpath([file_path, os.path.abspath(directory)]) == os.path.abspath(directory)
+
+def main(argv=None):
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+
+    input_file = os.path.abspath(arguments.input) if arguments.input else None
+    if input_file and not os.path.isfile(input_file):
+        print(f"No se ha encontrado el archivo de entrada {input_file}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    previous_directory = os.path.abspath(arguments.previous) if arguments.previous else None
+    if previous_directory and not os.path.isdir(previous_directory):
+        print(f"No se ha encontrado el directorio de la ejecución anterior {previous_directory}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    if arguments.work_dir:
+        properties.set_working_directory(arguments.work_dir)
+    if arguments.output:
+        properties.set_output_root(arguments.output)
+
+    properties.init_logging(__file__)
+    from . import clean_file, incremental, generate_batch_input, export_batch, process_batch_output
+
+    progress = ConsoleProgress()
+    try:
+        if arguments.resume:
+            file_parts = properties.get_file_parts(properties.BATCH_DATA_ROOT)
+            progress.update(60, f"Reanudando {len(file_parts)} archivos de batch")
+        else:
+            properties.clean_all()
+            if not is_in_directory(input_file, properties.INPUT_ROOT):
+                properties.clean_root(properties.INPUT_ROOT)
+                shutil.copy(input_file, properties.SOURCE_FILE_PATH)
+                input_file = properties.SOURCE_FILE_PATH
+
+            progress.update(10, "Limpieza del archivo")
+            if not clean_file.clean_file(input_file, interactive=False):
+                print("Error al limpiar el archivo", file=sys.stderr)
+                return EXIT_CLEAN_FAILED
+
+            if previous_directory:
+                progress.update(20, "Comparación con la ejecución anterior")
+                if not incremental.prepare_incremental_source(previous_directory):
+                    print("Error al comparar con la ejecución anterior", file=sys.stderr)
+                    return EXIT_INCREMENTAL_FAILED
+
+            progress.update(30, "Generación del archivo de input para el batch")
+            file_parts = generate_batch_input.generate_batch_input()
+            if file_parts is None:
+                print("Error al generar las solicitudes batch", file=sys.stderr)
+                return EXIT_GENERATE_FAILED
+            progress.update(60, f"Exportación del batch ({len(file_parts)} archivos)")
+
+        export_result = export_batch.export_batch(file_parts, progress)
+        if not export_result:
+            print("El proceso de traducción no se ha completado", file=sys.stderr)
+            return EXIT_EXPORT_FAILED
+
+        progress.update(90, "Reconstrucción del archivo traducido")
+        if not process_batch_output.process_batch_output():
+            print("Error al procesar el batch output", file=sys.stderr)
+            return EXIT_PROCESS_FAILED
+    except KeyboardInterrupt:
+        print("Proceso interrumpido. Los batches en curso se pueden reanudar con --resume", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        properties.get_logger(__file__).exception(f"Error inesperado durante el proceso de traducción: {e}")
+        print(f"Error inesperado durante el proceso de traducción: {e}", file=sys.stderr)
+        return EXIT_UNEXPECTED_ERROR
+
+    if export_result == export_batch.INCOMPLETE_RESULT:
+        progress.update(100, f"Proceso de traducción completado con solicitudes sin traducir: {properties.OUTPUT_ROOT}")
+        return EXIT_INCOMPLETE
+    progress.update(100, f"Proceso de traducción completado: {properties.OUTPUT_ROOT}")
+    return EXIT_OK
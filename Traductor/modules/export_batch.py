@@ -2,109 +2,327 @@ import time
 import threading
 import os
 import json
-from openai import OpenAI
 from .properties import *
+from .generate_batch_input import create_request, estimate_request_tokens
+from .request_packing import is_packed_id, get_packed_labels, get_response_content, parse_packed_translations
+from .languages import get_prompt, split_custom_id
+from .incremental import INCREMENTAL_SOURCE_FILE_PATH
+from .model_routing import DEFAULT_MAX_TOKENS, is_truncated_response
 
 logger = get_logger(__file__)
 
-client = OpenAI(api_key=API_KEY)
+client = None
 cancel_flag = False
 wait_event = threading.Event()
 
+def get_client():
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=API_KEY, base_url=OPENAI_BASE_URL)
+    return client
+
+PROCESSED_STATUS = "processed"
+FINAL_BATCH_STATUSES = ["completed", "failed", "cancelled", "expired"]
+RESUBMIT_BATCH_STATUSES = ["failed", "cancelled", "expired"]
+INCOMPLETE_RESULT = "incomplete"
+
 def load_state():
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, "r") as state_file:
-            return json.load(state_file)
-    return []
+            state = json.load(state_file)
+        if isinstance(state, list):
+            return {file_part: {"status": PROCESSED_STATUS} for file_part in state}
+        return state
+    return {}
 
-def dynamic_wait_time(start_time, min_wait=10, max_wait=600):
+def dynamic_wait_time(start_time, min_wait=BATCH_POLL_MIN_WAIT_INT, max_wait=BATCH_POLL_MAX_WAIT_INT):
     elapsed_time = time.time() - start_time
     wait_time = min(max_wait, max(min_wait, int(elapsed_time / 60)))
     logger.debug(f"Tiempo de espera ajustado a: {wait_time} segundos.")
     return wait_time
 
-def process_batch(file_path):
-    logger.debug(f"Subiendo el archivo de entrada {file_path}...")
-    batch_input_file = None
-    with open(file_path, "rb") as file:
-        batch_input_file = client.files.create(
-            file=file,
-            purpose="batch"
-        )
-        
-    if batch_input_file is None:
-        return None
+def submit_batch(file_path, state):
+    part_state = state[file_path]
+    if not part_state.get("file_id"):
+        logger.debug(f"Subiendo el archivo de entrada {file_path}...")
+        with open(file_path, "rb") as file:
+            batch_input_file = get_client().files.create(
+                file=file,
+                purpose="batch"
+            )
 
-    logger.debug(f"Archivo de entrada subido con ID: {batch_input_file.id}")
+        if batch_input_file is None:
+            return None
 
-    batch_input_file_id = batch_input_file.id
-    logger.debug("Creando el batch...")
+        part_state["file_id"] = batch_input_file.id
+        save_state(state)
+        logger.debug(f"Archivo de entrada subido con ID: {batch_input_file.id}")
 
-    batch = client.batches.create(
-        input_file_id=batch_input_file_id,
+    logger.debug("Creando el batch...")
+    batch = get_client().batches.create(
+        input_file_id=part_state["file_id"],
         endpoint="/v1/chat/completions",
         completion_window="24h",
         metadata={"description": f"Proceso de traducción del archivo {file_path}"}
     )
 
-    logger.debug(f"Batch creado con ID: {batch.id}")
+    part_state["batch_id"] = batch.id
+    part_state["status"] = batch.status
+    save_state(state)
+    logger.debug(f"Batch creado con ID: {batch.id} para el archivo {file_path}")
+    return batch.id
 
-    logger.debug("Supervisando el estado del batch...")
-    start_time = time.time()
-    status = client.batches.retrieve(batch.id).status
-    while status not in ["completed", "failed", "cancelled", "expired"]:
-        wait_time = dynamic_wait_time(start_time)
-        logger.debug(f"Estado actual del batch: {status}. Esperando {wait_time} segundos.")
-        wait_event.wait(wait_time)
-        if cancel_flag:
-            try:
-                client.batches.cancel(batch.id)
-                logger.debug("Batch cancelado.")
-                return None
-            except Exception as e:
-                logger.error(f"Ha ocurrido el siguiente error al intentar cancelar el batch; {e}")
-        status = client.batches.retrieve(batch.id).status
-
-    if status == "completed":
-        logger.debug("El batch se ha completado. Obteniendo resultados...")
-        output_file_id = client.batches.retrieve(batch.id).output_file_id
-        content = client.files.content(output_file_id)
-        return content.read()
-    else:
-        logger.error(f"El batch no se completó exitosamente. Estado final: {status}")
+def get_part_tokens(file_part, state):
+    part_state = state[file_part]
+    if "estimated_tokens" not in part_state:
+        model = None
+        estimated_tokens = 0
+        with open(file_part, "r", encoding=ENCODING) as file:
+            for line in file:
+                if line.strip():
+                    request = json.loads(line)
+                    model = request["body"]["model"]
+                    estimated_tokens += estimate_request_tokens(request)[0]
+        part_state.update({"model": model, "estimated_tokens": estimated_tokens})
+    return part_state["model"], part_state["estimated_tokens"]
+
+# El límite de tokens en cola de la API es por modelo y cuenta todos los batches en curso. Un archivo
+# solo se envía si cabe junto a los batches de su modelo que siguen en curso, o si no hay ninguno.
+def fits_enqueued_tokens(file_part, in_flight_batches, state):
+    model, estimated_tokens = get_part_tokens(file_part, state)
+    enqueued_tokens = sum(get_part_tokens(in_flight_part, state)[1] for in_flight_part in in_flight_batches if get_part_tokens(in_flight_part, state)[0] == model)
+    if enqueued_tokens and enqueued_tokens + estimated_tokens > MAX_ENQUEUED_TOKENS_INT:
+        logger.debug(f"El archivo {file_part} (~{estimated_tokens} tokens) espera a que terminen batches de {model} (~{enqueued_tokens} tokens en cola)")
+        return False
+    return True
+
+def is_successful_output(item):
+    response = item.get("response") or {}
+    return not item.get("error") and response.get("status_code", 200) == 200
+
+def get_part_output_path(file_part):
+    return os.path.join(BATCH_OUTPUT_ROOT, os.path.basename(file_part))
+
+def get_packed_ids(file_part):
+    packed_ids = {}
+    with open(file_part, "r", encoding=ENCODING) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if is_packed_id(request["custom_id"]):
+                packed_ids[request["custom_id"]] = set(get_packed_labels(request))
+    return packed_ids
+
+def download_batch_output(batch, output_path, packed_ids):
+    succeeded_ids = set()
+    truncated_count = 0
+    temporary_output_path = output_path + ".tmp"
+    logger.debug(f"Descargando resultados del batch {batch.id} (estado {batch.status}) en {output_path}...")
+    with get_client().files.with_streaming_response.content(batch.output_file_id) as response, open(temporary_output_path, "w", encoding=ENCODING) as output_file:
+        for line in response.iter_lines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not is_successful_output(item):
+                continue
+            custom_id = item["custom_id"]
+            if is_truncated_response(item["response"].get("body")):
+                truncated_count += 1
+                continue
+            if custom_id in packed_ids:
+                translations = parse_packed_translations(get_response_content(item["response"]["body"]), packed_ids[custom_id])
+                if len(translations) < len(packed_ids[custom_id]):
+                    logger.warning(f"La respuesta empaquetada {custom_id} solo contiene {len(translations)}/{len(packed_ids[custom_id])} traducciones válidas")
+                if not translations:
+                    continue
+                succeeded_ids.update(translations)
+                item["response"]["body"]["choices"][0]["message"]["content"] = json.dumps(translations, ensure_ascii=False)
+                line = json.dumps(item, ensure_ascii=False)
+            else:
+                succeeded_ids.add(custom_id)
+            output_file.write(line + "\n")
+    os.replace(temporary_output_path, output_path)
+    if truncated_count:
+        logger.warning(f"El batch {batch.id} tiene {truncated_count} respuestas cortadas por max_tokens. Se reintentarán con max_tokens {DEFAULT_MAX_TOKENS}")
+    return succeeded_ids
+
+def log_batch_errors(batch):
+    error_count = 0
+    first_error = None
+    with get_client().files.with_streaming_response.content(batch.error_file_id) as response:
+        for line in response.iter_lines():
+            if line.strip():
+                error_count += 1
+                first_error = first_error or line[:500]
+    if error_count:
+        logger.warning(f"El batch {batch.id} tiene {error_count} solicitudes con errores. Primer error: {first_error}")
+
+def collect_batch_results(batch, file_part, state):
+    succeeded_ids = set()
+    if batch.output_file_id:
+        output_path = get_part_output_path(file_part)
+        succeeded_ids = download_batch_output(batch, output_path, get_packed_ids(file_part))
+        state[file_part]["output_file"] = output_path
+
+    if batch.error_file_id:
+        log_batch_errors(batch)
+
+    return succeeded_ids
+
+def create_unpacked_requests(request, succeeded_ids):
+    language_code = split_custom_id(request["custom_id"])[0]
+    prompt = get_prompt(TRANSLATION_LANGUAGES.get(language_code, TRANSLATION_LANGUAGE))
+    return [
+        create_request(label, custom_id, request["body"]["model"], prompt)
+        for custom_id, label in get_packed_labels(request).items()
+        if custom_id not in succeeded_ids
+    ]
+
+def create_retry_part(file_part, succeeded_ids, state):
+    part_state = state[file_part]
+    missing_lines = []
+    with open(file_part, "r", encoding=ENCODING) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if request["custom_id"] in succeeded_ids:
+                continue
+            if is_packed_id(request["custom_id"]):
+                for single_request in create_unpacked_requests(request, succeeded_ids):
+                    missing_lines.append(json.dumps(single_request, ensure_ascii=False) + "\n")
+            elif request["body"]["max_tokens"] < DEFAULT_MAX_TOKENS:
+                request["body"]["max_tokens"] = DEFAULT_MAX_TOKENS
+                missing_lines.append(json.dumps(request, ensure_ascii=False) + "\n")
+            else:
+                missing_lines.append(line)
+    if not missing_lines:
+        return None
+
+    retries = part_state.get("retries", 0) + 1
+    if retries > BATCH_RETRY_LIMIT_INT:
+        logger.error(f"Quedan {len(missing_lines)} solicitudes sin traducir del archivo {file_part} después de {retries - 1} reintentos")
+        part_state["untranslated"] = len(missing_lines)
         return None
 
+    root_part = part_state.get("retry_of", file_part)
+    base, ext = os.path.splitext(root_part)
+    retry_part = f"{base}_retry_{retries}{ext}"
+    with open(retry_part, "w", encoding=ENCODING) as file:
+        file.writelines(missing_lines)
+    state[retry_part] = {"retry_of": root_part, "retries": retries}
+    logger.warning(f"{len(missing_lines)} solicitudes del archivo {file_part} no se han completado. Reintento {retries}/{BATCH_RETRY_LIMIT_INT} en {retry_part}")
+    return retry_part
+
+def get_export_result(state):
+    untranslated_count = sum(part_state.get("untranslated", 0) for part_state in state.values())
+    if untranslated_count:
+        logger.warning(f"Proceso de traducción completado con {untranslated_count} solicitudes sin traducir")
+        return INCOMPLETE_RESULT
+    return True
+
+def cancel_batches(in_flight_batches, state):
+    for file_part, batch_id in in_flight_batches.items():
+        try:
+            get_client().batches.cancel(batch_id)
+            state[file_part]["status"] = "cancelled"
+            logger.debug(f"Batch {batch_id} cancelado.")
+        except Exception as e:
+            logger.error(f"Ha ocurrido el siguiente error al intentar cancelar el batch {batch_id}; {e}")
+    save_state(state)
+
 def export_batch(file_parts, progress_bar):
     if not file_parts:
         logger.warning(f"No se han pasado como parámetro los archivos de input para el batch. Buscando en la carpeta {BATCH_DATA_ROOT}")
         file_parts = get_file_parts(BATCH_DATA_ROOT)
+        if not file_parts and (os.path.exists(CACHED_OUTPUT_FILE_PATH) or os.path.exists(INCREMENTAL_SOURCE_FILE_PATH)):
+            logger.info("Todas las traducciones se han obtenido de la memoria de traducciones o de la ejecución anterior. No es necesario crear batches")
+            return True
         if not file_parts:
             logger.error(f"No se han encontrado archivos .jsonl en {BATCH_DATA_ROOT}")
             return False
 
-    processed_parts = load_state()
+    state = load_state()
+    file_parts = file_parts + [file_part for file_part in state if file_part not in file_parts and os.path.exists(file_part)]
+    pending_parts = []
+    in_flight_batches = {}
+    for file_part in file_parts:
+        part_state = state.setdefault(file_part, {})
+        status = part_state.get("status")
+        if status == PROCESSED_STATUS:
+            continue
+        if part_state.get("batch_id"):
+            if status in RESUBMIT_BATCH_STATUSES:
+                logger.info(f"Recuperando los resultados parciales del batch {part_state['batch_id']} del archivo {file_part} (estado {status}). Solo se reenviarán las solicitudes que falten")
+            else:
+                logger.info(f"Reanudando el batch {part_state['batch_id']} del archivo {file_part} (estado {status})")
+            in_flight_batches[file_part] = part_state["batch_id"]
+        else:
+            pending_parts.append(file_part)
 
-    if file_parts == processed_parts:
+    if not pending_parts and not in_flight_batches:
         logger.warning("El proceso de traducción ya había finalizado")
-        return True
+        return get_export_result(state)
 
-    if processed_parts: 
-        logger.info(f"Reanudando proceso después de cancelación. Los archivos que ya han sido procesados son: {', '.join(processed_parts)}")
+    processed_count = len(file_parts) - len(pending_parts) - len(in_flight_batches)
+    if processed_count or in_flight_batches:
+        logger.info(f"Reanudando proceso después de cancelación. {processed_count} archivos ya procesados y {len(in_flight_batches)} batches en curso")
+
+    progress_step = 30 / len(file_parts)
+    progress_bar.update(min(90, progress_bar.progress.get() + progress_step * processed_count), f"Procesando {len(pending_parts) + len(in_flight_batches)} batches")
+
+    if not in_flight_batches:
+        from .realtime import choose_translation_mode, translate_realtime
+        if choose_translation_mode(pending_parts) == "realtime":
+            return translate_realtime(pending_parts, progress_bar, lambda: cancel_flag)
+
+    start_time = time.time()
+    while pending_parts or in_flight_batches:
+        for file_part in list(pending_parts):
+            if len(in_flight_batches) >= MAX_CONCURRENT_BATCHES_INT or cancel_flag:
+                break
+            if not fits_enqueued_tokens(file_part, in_flight_batches, state):
+                continue
+            pending_parts.remove(file_part)
+            batch_id = submit_batch(file_part, state)
+            if batch_id:
+                in_flight_batches[file_part] = batch_id
+            else:
+                logger.error(f"No se ha podido crear el batch para el archivo {file_part}")
 
-    for file_part in file_parts:
-        progress_bar.update(min(90, progress_bar.progress.get() + 30/len(file_parts)), f"Procesando batch {file_part}")
-        if file_part in processed_parts:
-            continue
-        result = process_batch(file_part)
-        if result:
-            with open(BATCH_OUTPUT_FILE_PATH, "ab") as output_file:
-                output_file.write(result)
-            processed_parts.append(file_part)
-            save_state(processed_parts)
-            logger.info(f"Archivo {file_part} processado. Guardando progreso en {STATE_FILE}")
         if cancel_flag:
             logger.debug("Handling cancel")
+            cancel_batches(in_flight_batches, state)
             return False
 
+        for file_part, batch_id in list(in_flight_batches.items()):
+            batch = get_client().batches.retrieve(batch_id)
+            part_state = state[file_part]
+            if batch.status != part_state.get("status"):
+                part_state["status"] = batch.status
+                save_state(state)
+            if batch.status not in FINAL_BATCH_STATUSES:
+                logger.debug(f"Estado actual del batch {batch_id} ({file_part}): {batch.status}")
+                continue
+
+            del in_flight_batches[file_part]
+            if batch.status != "completed":
+                logger.error(f"El batch {batch_id} del archivo {file_part} no se completó exitosamente. Estado final: {batch.status}")
+            succeeded_ids = collect_batch_results(batch, file_part, state)
+            retry_part = create_retry_part(file_part, succeeded_ids, state)
+            if retry_part:
+                pending_parts.append(retry_part)
+            part_state["status"] = PROCESSED_STATUS
+            save_state(state)
+            logger.info(f"Archivo {file_part} processado ({len(succeeded_ids)} traducciones). Guardando progreso en {STATE_FILE}")
+            progress_bar.update(min(90, progress_bar.progress.get() + progress_step), f"Batch {file_part} finalizado. Quedan {len(pending_parts) + len(in_flight_batches)} batches")
+
+        if in_flight_batches:
+            wait_time = dynamic_wait_time(start_time)
+            logger.debug(f"{len(in_flight_batches)} batches en curso. Esperando {wait_time} segundos.")
+            wait_event.wait(wait_time)
+
     logger.info("Proceso de traducción completado.")
-    return True
\ No newline at end of file
+    return get_export_result(state)
\ No newline at end of file
@@ -1,96 +1,282 @@
 import time
 import os
 import json
+from json.encoder import encode_basestring
 from .properties import *
+from .translation_memory import TranslationMemory
+from .request_packing import LabelPacker, estimate_tokens, PACKED_ID_PREFIX
+from .model_routing import load_model_router
+from .placeholders import PlaceholderMasker
+from .label_filter import LabelFilter, SKIPPED_REQUEST_ID
+from .stf_document import read_document, COMMENT, ENTRY
+from .languages import get_prompt, get_packing_prompt, tag_custom_id
+from .incremental import get_source_file_path
 
 logger = get_logger(__file__)
+trace = TraceSampler(logger)
 
 keys_dict = {}
+label_requests = {}
+label_filter = None
 
-def create_request(label, custom_id):
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+def create_request(label, custom_id, model=MODEL_NAME, prompt=PROMPT, max_tokens=1000):
     return {
         "custom_id": custom_id,
         "method": "POST",
         "url": "/v1/chat/completions",
         "body": {
-            "model": MODEL_NAME,
+            "model": model,
             "messages": [
                 {
                     "role": "system",
-                    "content": PROMPT
+                    "content": prompt
                 },
                 {
                     "role": "user",
                     "content": label
                 }
             ],
-            "max_tokens": 1000
+            "max_tokens": max_tokens
+        }
+    }
+
+class RequestSerializer:
+    CUSTOM_ID_PLACEHOLDER = "\x00custom_id\x00"
+    LABEL_PLACEHOLDER = "\x00label\x00"
+
+    def __init__(self, model=MODEL_NAME, prompt=PROMPT, max_tokens=1000):
+        template = json.dumps(create_request(self.LABEL_PLACEHOLDER, self.CUSTOM_ID_PLACEHOLDER, model, prompt, max_tokens), ensure_ascii=False)
+        self.head, rest = template.split(encode_basestring(self.CUSTOM_ID_PLACEHOLDER))
+        self.middle, self.tail = rest.split(encode_basestring(self.LABEL_PLACEHOLDER))
+        self.tail += "\n"
+        self.max_tokens = max_tokens
+        self.envelope_tokens = estimate_tokens(prompt) + 8
+
+    def serialize(self, label, custom_id):
+        line = self.head + encode_basestring(custom_id) + self.middle + encode_basestring(label) + self.tail
+        label_tokens = estimate_tokens(label)
+        return line, self.envelope_tokens + label_tokens, min(self.max_tokens, label_tokens)
+
+def create_cached_output(translation, custom_id):
+    return {
+        "custom_id": custom_id,
+        "response": {
+            "body": {
+                "choices": [
+                    {
+                        "message": {
+                            "role": "assistant",
+                            "content": translation
+                        }
+                    }
+                ]
+            }
         }
     }
 
+def estimate_request_tokens(request):
+    messages = request["body"]["messages"]
+    input_tokens = sum(estimate_tokens(message["content"]) + 4 for message in messages)
+    output_tokens = min(request["body"]["max_tokens"], estimate_tokens(messages[-1]["content"]))
+    return input_tokens, output_tokens
+
+def estimate_cost(input_tokens, output_tokens, model=MODEL_NAME):
+    input_price, output_price = BATCH_MODEL_TOKEN_PRICES.get(model, (BATCH_INPUT_TOKEN_PRICE_FLOAT, BATCH_OUTPUT_TOKEN_PRICE_FLOAT))
+    return (input_tokens * input_price + output_tokens * output_price) / 1000000
+
+class BatchInputWriter:
+    def __init__(self, max_lines=MAX_BATCH_INPUT_LINES_INT, max_tokens=MAX_BATCH_INPUT_TOKENS_INT, max_bytes=MAX_BATCH_INPUT_BYTES_INT, name=None, model=MODEL_NAME):
+        self.name = name
+        self.model = model
+        self.max_lines = max_lines
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.file_number = 1
+        self.jsonl_file = None
+        self.input_files_paths = []
+        self.request_count = 0
+        self.total_input_tokens = 0
+        self.total_output_tokens = 0
+        self.reset_part_counters()
+
+    def reset_part_counters(self):
+        self.line_count = 0
+        self.part_input_tokens = 0
+        self.part_output_tokens = 0
+        self.part_bytes = 0
+
+    def write(self, request):
+        input_tokens, output_tokens = estimate_request_tokens(request)
+        self.write_line(json.dumps(request, ensure_ascii=False) + "\n", input_tokens, output_tokens)
+
+    def write_line(self, line, input_tokens, output_tokens):
+        line = line.encode(ENCODING)
+        line_bytes = len(line)
+
+        if (not self.jsonl_file or self.line_count + 1 > self.max_lines
+                or self.part_input_tokens + input_tokens > self.max_tokens
+                or self.part_bytes + line_bytes > self.max_bytes):
+            self.open_next_part()
+
+        self.jsonl_file.write(line)
+        self.line_count += 1
+        self.request_count += 1
+        self.part_input_tokens += input_tokens
+        self.part_output_tokens += output_tokens
+        self.part_bytes += line_bytes
+
+    def open_next_part(self):
+        self.close_part()
+        input_file_path = f"{BATCH_DATA_ROOT}batch_part_{self.name}_{self.file_number}.jsonl" if self.name else f"{BATCH_DATA_ROOT}batch_part_{self.file_number}.jsonl"
+        os.makedirs(os.path.dirname(input_file_path), exist_ok=True)
+        self.input_files_paths.append(input_file_path)
+        self.jsonl_file = open(input_file_path, "wb", buffering=WRITE_BUFFER_SIZE)
+        self.file_number += 1
+
+    def close_part(self):
+        if not self.jsonl_file:
+            return
+        self.jsonl_file.close()
+        self.jsonl_file = None
+        self.total_input_tokens += self.part_input_tokens
+        self.total_output_tokens += self.part_output_tokens
+        cost = estimate_cost(self.part_input_tokens, self.part_output_tokens, self.model)
+        logger.info(f"Archivo {self.input_files_paths[-1]}: {self.line_count} solicitudes, {self.part_bytes} bytes, ~{self.part_input_tokens} tokens de entrada, ~{self.part_output_tokens} tokens de salida, coste estimado {cost:.2f} USD")
+        self.reset_part_counters()
+
+    def close(self):
+        self.close_part()
+        if self.input_files_paths:
+            cost = estimate_cost(self.total_input_tokens, self.total_output_tokens, self.model)
+            logger.info(f"Total{f' ({self.name})' if self.name else ''}: {len(self.input_files_paths)} archivos, {self.request_count} solicitudes, ~{self.total_input_tokens} tokens de entrada, ~{self.total_output_tokens} tokens de salida, coste estimado {cost:.2f} USD")
+
 def save_keys():
     with open(KEYS_FILE_PATH, "w", encoding=ENCODING) as file:
         json.dump(keys_dict, file, ensure_ascii=False, indent=4)
     logger.info(f"Archivo JSON con las keys guardado en: {KEYS_FILE_PATH}")
 
-def process_line(line, index):
-    if line.startswith("#"):
-        logger.debug(f"Línea comentada: {line}")
+def process_record(record, index):
+    if record.kind == COMMENT:
+        trace.trace("líneas comentadas", "Línea comentada: %s", record.line.rstrip())
         return None
-    logger.debug(f"{index} - Procesando línea: {line}")
-    parts = line.split("\t", 1)
-    if len(parts) == 2:
-        key, label = parts
+    trace.trace("líneas procesadas", "%s - Procesando línea: %s", index, record.line.rstrip())
+    if record.kind == ENTRY:
+        key, label = record.key, record.label.rstrip()
+        normalized_label = label.strip()
+        if label_filter:
+            rule = label_filter.match(normalized_label)
+            if rule:
+                keys_dict.setdefault(SKIPPED_REQUEST_ID, []).append(key)
+                trace.trace("labels filtrados", "Label no traducible (%s) para la key %s", rule, key)
+                return None
+        custom_id = label_requests.get(normalized_label)
+        if custom_id:
+            keys_dict[custom_id].append(key)
+            trace.trace("labels repetidos", "Label repetido, se reutiliza la solicitud %s para la key %s", custom_id, key)
+            return None
         custom_id = f"request-{index}"
-        keys_dict[key] = custom_id
-        return create_request(label, custom_id)
+        label_requests[normalized_label] = custom_id
+        keys_dict[custom_id] = [key]
+        return custom_id, key, label
         
-    logger.debug(f"Línea no traducible: {line}")
+    trace.trace("líneas no traducibles", "Línea no traducible: %s", record.line.rstrip())
     return None
 
-def generate_input_files(input_path=SOURCE_FILE_PATH, max_lines=MAX_BATCH_INPUT_LINES_INT):
-    input_files_paths = []
+def generate_input_files(input_path=SOURCE_FILE_PATH):
+    global label_filter
+    keys_dict.clear()
+    label_requests.clear()
+    label_filter = LabelFilter() if USE_LABEL_FILTER else None
+    trace.reset()
     logger.info(f"Iniciando la creación de solicitudes batch a partir del archivo {input_path}")
 
-    def read_lines(filepath):
-        with open(filepath, "r", encoding=ENCODING) as file:
-            yield from file
-
-    file_number = 1
-    jsonl_file = None
     index = 1
-    line_count = max_lines
+    router = load_model_router()
+    writers = {model: BatchInputWriter(name=model if len(router.models) > 1 else None, model=model) for model in router.models}
+    prompts = {language_code: get_prompt(language) for language_code, language in TRANSLATION_LANGUAGES.items()}
+    serializers = {}
+    packers = {}
+    if USE_REQUEST_PACKING:
+        packers = {
+            (language_code, model): LabelPacker(language_code, get_packing_prompt(language), model=model, id_prefix=f"{PACKED_ID_PREFIX}{model_index}-" if model_index else PACKED_ID_PREFIX)
+            for language_code, language in TRANSLATION_LANGUAGES.items()
+            for model_index, model in enumerate(router.models)
+        }
+    route_counts = dict.fromkeys(router.models, 0)
+    masker = PlaceholderMasker() if USE_PLACEHOLDER_MASKING else None
+    translation_memory = TranslationMemory() if USE_TRANSLATION_MEMORY else None
+    cached_file = open(CACHED_OUTPUT_FILE_PATH, "w", encoding=ENCODING) if translation_memory else None
 
-    for line in read_lines(input_path):
-        request = process_line(line.rstrip(), index)
+    for record in read_document(input_path):
+        entry = process_record(record, index)
 
-        if request:
-            line_count += 1
+        if entry:
             index += 1
-            if line_count > max_lines:
-                line_count = 1
-                if jsonl_file:
-                    jsonl_file.close()
-                input_file_path = f"{BATCH_DATA_ROOT}batch_part_{file_number}.jsonl"
-                os.makedirs(os.path.dirname(input_file_path), exist_ok=True)
-                input_files_paths.append(input_file_path)
-                jsonl_file = open(input_file_path, "w", encoding=ENCODING)
-                file_number += 1
-            jsonl_file.write(json.dumps(request, ensure_ascii=False) + "\n")
-    
-    if jsonl_file:
-        jsonl_file.close()
-
-    logger.debug(f"Total de solicitudes creadas: {index - 1}")
+            request_id, key, label = entry
+            route = router.get_route(key, label, record.metadata_type)
+            route_counts[route.model] += 1
+            writer = writers[route.model]
+            masked_label = None
+            for language_code, language in TRANSLATION_LANGUAGES.items():
+                custom_id = tag_custom_id(request_id, language_code)
+                if translation_memory:
+                    translation = translation_memory.get(label, language, prompts[language_code], route.model)
+                    if translation is not None:
+                        cached_file.write(json.dumps(create_cached_output(translation, custom_id), ensure_ascii=False) + "\n")
+                        trace.trace("traducciones obtenidas de la memoria", "Traducción obtenida de la memoria para el custom_id %s", custom_id)
+                        continue
+
+                if masked_label is None:
+                    masked_label = masker.mask(request_id, label) if masker else label
+                packer = packers.get((language_code, route.model))
+                if packer and packer.accepts(masked_label):
+                    packed_request = packer.add(custom_id, masked_label)
+                    if packed_request:
+                        writer.write(packed_request)
+                    continue
+
+                serializer = serializers.get((language_code, route))
+                if serializer is None:
+                    serializer = serializers[(language_code, route)] = RequestSerializer(route.model, prompts[language_code], route.max_tokens)
+                writer.write_line(*serializer.serialize(masked_label, custom_id))
+
+    for (language_code, model), packer in packers.items():
+        packed_request = packer.flush()
+        if packed_request:
+            writers[model].write(packed_request)
+        if packer.packed_labels:
+            saved_tokens = (packer.packed_labels - packer.pack_count) * estimate_tokens(prompts[language_code])
+            logger.info(f"Empaquetado de solicitudes ({language_code}, {model}): {packer.packed_labels} labels en {packer.pack_count} solicitudes (~{saved_tokens} tokens de prompt evitados)")
+    for writer in writers.values():
+        writer.close()
+    if len(router.models) > 1:
+        logger.info("Enrutado de modelos: " + ", ".join(f"{model}: {count} labels" for model, count in route_counts.items()))
+
+    if translation_memory:
+        cached_file.close()
+        translation_memory.close()
+
+    trace.summary("Resumen de la generación de solicitudes")
+    logger.debug(f"Total de solicitudes creadas: {sum(writer.request_count for writer in writers.values())}")
+    unique_labels = len(keys_dict) - (SKIPPED_REQUEST_ID in keys_dict)
+    total_keys = sum(len(request_keys) for request_id, request_keys in keys_dict.items() if request_id != SKIPPED_REQUEST_ID)
+    if total_keys:
+        logger.info(f"Deduplicación de labels: {total_keys} keys agrupadas en {unique_labels} labels únicos (ratio {total_keys / unique_labels:.2f}, {1 - unique_labels / total_keys:.1%} de solicitudes evitadas)")
 
+    if label_filter:
+        label_filter.log_summary()
     save_keys()
+    if masker:
+        masker.save()
 
     logger.info(f"Archivos JSONL con las solicitudes batch guardados en: {BATCH_DATA_ROOT}")
-    return input_files_paths
+    return [input_file_path for writer in writers.values() for input_file_path in writer.input_files_paths]
 
 def generate_batch_input():
     start_time = time.time()
-    input_files = generate_input_files()
+    input_files = generate_input_files(get_source_file_path())
     end_time = time.time()
     logger.info(f"Tiempo total de creación de solicitudes batch: {(end_time - start_time):.2f} segundos")
     return input_files
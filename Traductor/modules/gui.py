@@ -13,6 +13,7 @@ logger = get_logger(__file__)
 class MainApp(tk.Tk):
     def __init__(self):
         super().__init__()
+        init_logging(__file__)
 
         self.minsize(400, 250)
         self.file_path = None
@@ -134,6 +135,7 @@ class MainApp(tk.Tk):
         self.check_future(future, self.after_export_batch)
 
     def after_export_batch(self, batch_exported):
+        self.batch_exported = batch_exported
         if batch_exported:
             from modules.process_batch_output import process_batch_output
             future = self.executor.submit(process_batch_output)
@@ -144,6 +146,8 @@ class MainApp(tk.Tk):
     def after_process_batch_output(self, output_processed):
         if output_processed:
             self.update_progress(100, "Proceso de Traducción Completado")
+            if self.batch_exported == export_batch.INCOMPLETE_RESULT:
+                messagebox.showwarning("Advertencia", "Algunas solicitudes no se han podido traducir después de todos los reintentos. Revisa el log.")
             self.after(0, self.backup)
         else:
             logger.warning("Error al procesar el batch output")
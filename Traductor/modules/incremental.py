@@ -0,0 +1,116 @@
+import os
+from array import array
+from bisect import bisect_left
+from .properties import *
+from .languages import get_language_file_path
+from .stf_document import parse_line, read_document, ENTRY
+
+logger = get_logger(__file__)
+
+INCREMENTAL_SOURCE_FILE_PATH = os.path.join(INCREMENTAL_ROOT, SOURCE_FILE_NAME)
+
+def get_source_file_path():
+    if os.path.exists(INCREMENTAL_SOURCE_FILE_PATH):
+        return INCREMENTAL_SOURCE_FILE_PATH
+    return SOURCE_FILE_PATH
+
+def get_carried_file_path(language_code):
+    return os.path.join(INCREMENTAL_ROOT, os.path.basename(get_language_file_path(TRANSLATED_FILE_PATH, language_code)))
+
+# Solo se busca en el directorio de entrada o de salida de la ejecución anterior, o en la raíz si se
+# trata de una carpeta con los dos archivos. Una copia de seguridad también contiene resources/incremental
+# con archivos parciales del mismo nombre, que no se deben usar.
+def find_file(directory, directory_names, file_name):
+    for directory_name in directory_names + [""]:
+        file_path = os.path.join(directory, directory_name, file_name)
+        if os.path.isfile(file_path):
+            return file_path
+    return None
+
+def read_entries(file_path):
+    with open(file_path, "r", encoding=ENCODING) as file:
+        for line in file:
+            record = parse_line(line)
+            if record.kind == ENTRY:
+                yield record.key, record.label.rstrip("\r\n")
+
+def sorted_hashes(hashes):
+    return array("q", sorted(hashes))
+
+def contains(hashes, value):
+    index = bisect_left(hashes, value)
+    return index < len(hashes) and hashes[index] == value
+
+def prepare_incremental_source(previous_directory, source_file_path=SOURCE_FILE_PATH):
+    previous_source_path = find_file(previous_directory, [INPUT_DIR_NAME], SOURCE_FILE_NAME)
+    if not previous_source_path:
+        logger.error(f"No se ha encontrado el archivo {SOURCE_FILE_NAME} de la ejecución anterior en {previous_directory}")
+        return False
+
+    output_dir_names = [DEFAULT_OUTPUT_DIR_NAME, os.path.basename(os.path.normpath(OUTPUT_DIR_NAME))]
+    previous_translated_paths = {}
+    for language_code in TRANSLATION_LANGUAGES:
+        file_name = os.path.basename(get_language_file_path(TRANSLATED_FILE_PATH, language_code))
+        previous_translated_paths[language_code] = find_file(previous_directory, output_dir_names, file_name)
+        if not previous_translated_paths[language_code]:
+            logger.error(f"No se ha encontrado el archivo {file_name} de la ejecución anterior en {previous_directory}")
+            return False
+
+    previous_entries = sorted_hashes(hash(f"{key}\t{label.rstrip()}") for key, label in read_entries(previous_source_path))
+    previous_keys = sorted_hashes(hash(key) for key, _ in read_entries(previous_source_path))
+    logger.info(f"Archivo de la ejecución anterior leído: {previous_source_path} ({len(previous_keys)} keys)")
+
+    new_count = 0
+    changed_count = 0
+    current_keys = array("q")
+    unchanged_keys = array("q")
+    for key, label in read_entries(source_file_path):
+        key_hash = hash(key)
+        current_keys.append(key_hash)
+        if contains(previous_entries, hash(f"{key}\t{label.rstrip()}")):
+            unchanged_keys.append(key_hash)
+        elif contains(previous_keys, key_hash):
+            changed_count += 1
+        else:
+            new_count += 1
+    del previous_entries
+    current_keys = sorted_hashes(current_keys)
+    removed_count = sum(1 for key_hash in previous_keys if not contains(current_keys, key_hash))
+    del previous_keys, current_keys
+
+    carried_keys = sorted_hashes(unchanged_keys)
+    for previous_translated_path in previous_translated_paths.values():
+        translated_keys = sorted_hashes(hash(key) for key, _ in read_entries(previous_translated_path) if contains(carried_keys, hash(key)))
+        carried_keys = array("q", (key_hash for key_hash in carried_keys if contains(translated_keys, key_hash)))
+
+    os.makedirs(INCREMENTAL_ROOT, exist_ok=True)
+    for language_code, previous_translated_path in previous_translated_paths.items():
+        with open(previous_translated_path, "r", encoding=ENCODING) as infile, open(get_carried_file_path(language_code), "w", encoding=ENCODING) as outfile:
+            for line in infile:
+                record = parse_line(line)
+                if record.kind == ENTRY and contains(carried_keys, hash(record.key)):
+                    outfile.write(line if line.endswith("\n") else line + "\n")
+
+    retranslated_count = 0
+    with open(INCREMENTAL_SOURCE_FILE_PATH, "w", encoding=ENCODING) as outfile:
+        for record in read_document(source_file_path):
+            if record.kind != ENTRY:
+                outfile.write(record.line)
+            elif not contains(carried_keys, hash(record.key)):
+                outfile.write(record.line)
+                retranslated_count += 1
+
+    logger.info(f"Traducción incremental: {new_count} keys nuevas, {changed_count} modificadas, {removed_count} eliminadas, {len(unchanged_keys)} sin cambios ({len(carried_keys)} traducciones reutilizadas, {retranslated_count} keys a traducir)")
+    return True
+
+def append_carried_translations(language_code, outfile):
+    carried_file_path = get_carried_file_path(language_code)
+    if not os.path.exists(carried_file_path):
+        return 0
+    carried_count = 0
+    with open(carried_file_path, "r", encoding=ENCODING) as infile:
+        for line in infile:
+            outfile.write(line)
+            carried_count += 1
+    logger.info(f"{carried_count} traducciones reutilizadas de la ejecución anterior ({language_code})")
+    return carried_count
@@ -0,0 +1,72 @@
+import re
+from .properties import *
+from .placeholders import maskable_pattern
+from .request_packing import estimate_tokens
+
+logger = get_logger(__file__)
+
+SKIPPED_REQUEST_ID = "skipped"
+
+api_name_pattern = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:(?:_{1,2}[A-Za-z0-9]+)+|(?:\.[A-Za-z_]\w*)+)")
+url_pattern = re.compile(r"(?:https?://|www\.)\S+|[\w.+-]+@[\w-]+(?:\.[\w-]+)+", re.IGNORECASE)
+word_pattern = re.compile(r"\w+")
+letter_pattern = re.compile(r"[^\W\d_]")
+
+STOPWORDS = {
+    "en": {"the", "and", "or", "of", "to", "in", "for", "with", "is", "are", "this", "that", "be", "on", "by", "from", "your", "you", "not", "an"},
+    "es": {"el", "la", "los", "las", "del", "y", "o", "en", "con", "para", "por", "que", "se", "un", "una", "es", "está", "son", "al", "su", "sus", "este", "esta", "no"},
+    "fr": {"le", "la", "les", "des", "du", "et", "ou", "en", "avec", "pour", "par", "que", "est", "sont", "un", "une", "ce", "cette", "dans", "sur", "pas", "vous"},
+    "de": {"der", "die", "das", "und", "oder", "mit", "für", "von", "ist", "sind", "ein", "eine", "nicht", "auf", "im", "zu", "den", "dem"},
+    "it": {"il", "lo", "la", "gli", "le", "e", "o", "di", "del", "della", "con", "per", "che", "è", "sono", "un", "una", "non", "nel", "sul"},
+    "pt": {"o", "a", "os", "as", "do", "da", "dos", "das", "e", "ou", "em", "com", "para", "por", "que", "é", "são", "um", "uma", "não", "no", "na"},
+}
+MIN_LANGUAGE_HITS = 2
+
+def has_letters(text):
+    return letter_pattern.search(text) is not None
+
+def detect_language(label):
+    words = [word.lower() for word in word_pattern.findall(label)]
+    hits = sorted(((sum(word in stopwords for word in words), language_code) for language_code, stopwords in STOPWORDS.items()), reverse=True)
+    (best_hits, best_language), (second_hits, _) = hits[0], hits[1]
+    if best_hits >= MIN_LANGUAGE_HITS and best_hits > second_hits:
+        return best_language
+    return None
+
+# Reglas baratas que se evalúan en orden antes de crear la solicitud; gana la primera que coincide. La
+# detección de idioma solo se usa con un único idioma de destino, ya que un label que ya está en ese
+# idioma sigue necesitando traducción al resto.
+class LabelFilter:
+    def __init__(self, language_detection=LABEL_FILTER_LANGUAGE_DETECTION):
+        self.rules = [
+            ("vacío", lambda label: not label),
+            ("sin letras", lambda label: not has_letters(label)),
+            ("solo variables o HTML", lambda label: not has_letters(maskable_pattern.sub("", label))),
+            ("nombre de API", lambda label: api_name_pattern.fullmatch(label) is not None),
+            ("URL o email", lambda label: url_pattern.fullmatch(label) is not None),
+        ]
+        target_codes = list(TRANSLATION_LANGUAGES)
+        if language_detection and len(target_codes) == 1 and target_codes[0] in STOPWORDS:
+            self.rules.append(("ya en el idioma de destino", lambda label: detect_language(label) == target_codes[0]))
+        self.request_tokens = estimate_tokens(PROMPT) + 8
+        self.counts = {name: 0 for name, _ in self.rules}
+        self.saved_tokens = {name: 0 for name, _ in self.rules}
+        self.skipped_labels = set()
+
+    def match(self, label):
+        for name, rule in self.rules:
+            if rule(label):
+                self.counts[name] += 1
+                if label not in self.skipped_labels:
+                    self.skipped_labels.add(label)
+                    self.saved_tokens[name] += (self.request_tokens + 2 * estimate_tokens(label)) * len(TRANSLATION_LANGUAGES)
+                return name
+        return None
+
+    def log_summary(self):
+        skipped_keys = sum(self.counts.values())
+        if not skipped_keys:
+            return
+        action = "copiadas sin traducir" if LABEL_FILTER_MODE == "copy" else "omitidas del archivo traducido"
+        rules = ", ".join(f"{name}: {count} (~{self.saved_tokens[name]} tokens)" for name, count in self.counts.items() if count)
+        logger.info(f"Filtro de labels no traducibles: {skipped_keys} keys {action}, {len(self.skipped_labels)} solicitudes evitadas. {rules}")
@@ -0,0 +1,59 @@
+import re
+
+DEFAULT_LABEL_TYPE = "DEFAULT_LABEL_TYPE"
+MAX_CACHED_SHAPES = 100000
+
+simple_pattern = re.compile(r"\^?(\w+)(?:\\\.(?:\.\*(?:\\\.(\w+))?)?)?\$?")
+
+# Mantiene la semántica de re.search en orden (gana el primer patrón que coincide), pero compila
+# los patrones una vez, descarta los que no contienen su literal y cachea el resultado por forma
+# de key. La forma es el primer y último componente de la key; solo se cachea cuando todos los
+# patrones son del tipo "A", "A\..*" o "A\..*\.B" y los componentes intermedios no contienen
+# ningún literal de los patrones, ya que entonces no pueden influir en el resultado.
+class LabelTypeClassifier:
+    def __init__(self, metadata_types):
+        self.rules = []
+        literals = set()
+        self.use_shape_cache = True
+
+        for metadata_type, pattern in metadata_types.items():
+            match = simple_pattern.fullmatch(pattern)
+            if match:
+                literal = match.group(1)
+                literals.update(group for group in match.groups() if group)
+            else:
+                literal = ""
+                self.use_shape_cache = False
+            self.rules.append((literal, re.compile(pattern), metadata_type))
+
+        self.literal_pattern = re.compile("|".join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True)))
+        self.shape_cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, key):
+        for literal, pattern, metadata_type in self.rules:
+            if literal in key and pattern.search(key):
+                return metadata_type
+        return DEFAULT_LABEL_TYPE
+
+    def classify(self, key):
+        if not self.use_shape_cache:
+            return self.match(key)
+
+        first, first_separator, rest = key.partition(".")
+        middle, last_separator, last = rest.rpartition(".")
+        if self.literal_pattern.search(middle):
+            self.misses += 1
+            return self.match(key)
+
+        shape = (first, first_separator, last_separator, last)
+        label_type = self.shape_cache.get(shape)
+        if label_type is None:
+            self.misses += 1
+            if len(self.shape_cache) >= MAX_CACHED_SHAPES:
+                self.shape_cache.clear()
+            label_type = self.shape_cache[shape] = self.match(key)
+        else:
+            self.hits += 1
+        return label_type
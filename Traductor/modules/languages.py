@@ -0,0 +1,23 @@
+import os
+from .properties import *
+
+LANGUAGE_SEPARATOR = ":"
+
+def get_prompt(language):
+    return PROMPT_TEMPLATE % {"SOURCE_LANGUAGE": SOURCE_LANGUAGE, "TRANSLATION_LANGUAGE": language, "PLACEHOLDER_HTML5": PLACEHOLDER_HTML5, "PLACEHOLDER_VARIABLE": PLACEHOLDER_VARIABLE}
+
+def get_packing_prompt(language):
+    return PACKING_PROMPT_TEMPLATE % {"PROMPT": get_prompt(language)}
+
+def tag_custom_id(custom_id, language_code):
+    return f"{language_code}{LANGUAGE_SEPARATOR}{custom_id}"
+
+def split_custom_id(custom_id):
+    language_code, _, request_id = custom_id.rpartition(LANGUAGE_SEPARATOR)
+    return language_code, request_id
+
+def get_language_file_path(file_path, language_code):
+    if len(TRANSLATION_LANGUAGES) == 1:
+        return file_path
+    base, ext = os.path.splitext(file_path)
+    return f"{base}_{language_code}{ext}"
@@ -0,0 +1,59 @@
+import json
+from collections import namedtuple
+from .properties import *
+from .label_types import LabelTypeClassifier, DEFAULT_LABEL_TYPE
+
+logger = get_logger(__file__)
+
+DEFAULT_MAX_TOKENS = 1000
+CHARACTERS_PER_TOKEN = 1
+MAX_TOKENS_MARGIN = 16
+
+Route = namedtuple("Route", ["model", "max_tokens"])
+
+# Un token por carácter deja margen para idiomas de destino como el japonés, el chino o el ruso, que
+# usan bastantes más tokens por carácter que el inglés. max_tokens solo es un límite, así que no
+# encarece las respuestas normales; las que aun así se cortan se reintentan con DEFAULT_MAX_TOKENS.
+def get_max_tokens(char_limit):
+    return min(DEFAULT_MAX_TOKENS, char_limit // CHARACTERS_PER_TOKEN + MAX_TOKENS_MARGIN)
+
+def is_truncated_response(body):
+    choices = (body or {}).get("choices") or [{}]
+    return choices[0].get("finish_reason") == "length"
+
+# Cada tipo de metadato usa el modelo de su entrada en model_routing.json (MODEL_NAME si no tiene) y un
+# max_tokens derivado de su límite de carácteres. Los labels que ya superan el límite usan el max_tokens
+# por defecto para no cortar la traducción; el Excel de traducciones largas los sigue señalando.
+class ModelRouter:
+    def __init__(self, routing, character_limits, label_type_classifier):
+        self.label_type_classifier = label_type_classifier
+        self.routes = {}
+        for label_type in set(character_limits) | set(routing):
+            entry = routing.get(label_type, {})
+            char_limit = character_limits.get(label_type, character_limits[DEFAULT_LABEL_TYPE])
+            self.routes[label_type] = Route(entry.get("model", MODEL_NAME), entry.get("max_tokens", get_max_tokens(char_limit)))
+        self.default_route = self.routes.get(DEFAULT_LABEL_TYPE, Route(MODEL_NAME, DEFAULT_MAX_TOKENS))
+        self.models = sorted({route.model for route in self.routes.values()} | {self.default_route.model})
+
+    def get_route(self, key, label="", label_type=None):
+        if not self.label_type_classifier:
+            return self.default_route
+        route = self.routes.get(label_type or self.label_type_classifier.classify(key), self.default_route)
+        if get_max_tokens(len(label)) > route.max_tokens:
+            return route._replace(max_tokens=DEFAULT_MAX_TOKENS)
+        return route
+
+def load_model_router(character_limits=None, label_type_classifier=None):
+    if not USE_MODEL_ROUTING:
+        return ModelRouter({}, {}, None)
+
+    if character_limits is None:
+        with open(CHARACTER_LIMITS_FILE_PATH, "r", encoding=ENCODING) as file:
+            character_limits = json.load(file)
+    if label_type_classifier is None:
+        with open(METADATA_TYPES_FILE_PATH, "r", encoding=ENCODING) as file:
+            label_type_classifier = LabelTypeClassifier(json.load(file))
+    with open(MODEL_ROUTING_FILE_PATH, "r", encoding=ENCODING) as file:
+        routing = json.load(file)
+    logger.info(f"Archivo de enrutado de modelos leído: {MODEL_ROUTING_FILE_PATH}")
+    return ModelRouter(routing, character_limits, label_type_classifier)
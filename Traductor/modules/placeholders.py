@@ -0,0 +1,80 @@
+import json
+import os
+import re
+from .properties import *
+from .request_packing import estimate_tokens
+
+logger = get_logger(__file__)
+
+html_tag_pattern = re.compile(r"</?[A-Za-z][^<>]*>")
+variable_pattern = re.compile(r"\{![^{}]*\}")
+maskable_pattern = re.compile(f"{html_tag_pattern.pattern}|{variable_pattern.pattern}")
+placeholder_pattern = re.compile(rf"\[({re.escape(PLACEHOLDER_HTML5)}|{re.escape(PLACEHOLDER_VARIABLE)})(\d+)\]")
+
+def get_placeholder(original, index):
+    placeholder_type = PLACEHOLDER_VARIABLE if original.startswith("{!") else PLACEHOLDER_HTML5
+    return f"[{placeholder_type}{index}]"
+
+# Sustituye los merge fields {!var} y las etiquetas HTML de cada label por [VAR1], [HTML2]... antes de
+# enviarlo. Las etiquetas más cortas que su placeholder, como <b>, se dejan tal cual. Solo se guarda, por
+# request, la lista de textos originales: el número del placeholder es su posición en la lista y las
+# repeticiones de una misma etiqueta reutilizan el mismo placeholder.
+class PlaceholderMasker:
+    def __init__(self):
+        self.placeholders = {}
+        self.masked_labels = 0
+        self.html_tags = 0
+        self.variables = 0
+        self.saved_tokens = 0
+
+    def mask(self, request_id, label):
+        if "<" not in label and "{!" not in label or placeholder_pattern.search(label):
+            return label
+
+        originals = []
+        def replace(match):
+            original = match.group()
+            if original not in originals:
+                if not original.startswith("{!") and len(original) <= len(get_placeholder(original, len(originals) + 1)):
+                    return original
+                originals.append(original)
+                if original.startswith("{!"):
+                    self.variables += 1
+                else:
+                    self.html_tags += 1
+            return get_placeholder(original, originals.index(original) + 1)
+
+        masked_label = maskable_pattern.sub(replace, label)
+        if not originals:
+            return label
+        self.placeholders[request_id] = originals
+        self.masked_labels += 1
+        self.saved_tokens += estimate_tokens(label) - estimate_tokens(masked_label)
+        return masked_label
+
+    def save(self, file_path=PLACEHOLDERS_FILE_PATH):
+        with open(file_path, "w", encoding=ENCODING) as file:
+            json.dump(self.placeholders, file, ensure_ascii=False, separators=(",", ":"))
+        if self.masked_labels:
+            logger.info(f"Enmascarado de placeholders: {self.masked_labels} labels, {self.html_tags} etiquetas HTML y {self.variables} variables sustituidas (~{self.saved_tokens} tokens de entrada y hasta ~{self.saved_tokens} de salida evitados por idioma)")
+
+def load_placeholders(file_path=PLACEHOLDERS_FILE_PATH):
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, "r", encoding=ENCODING) as file:
+        placeholders = json.load(file)
+    logger.info(f"Archivo de placeholders leído: {file_path}")
+    return placeholders
+
+def restore_placeholders(text, originals):
+    found = set()
+    def replace(match):
+        index = int(match.group(2))
+        if index > len(originals) or get_placeholder(originals[index - 1], index) != match.group():
+            return match.group()
+        found.add(index)
+        return originals[index - 1]
+
+    restored_text = placeholder_pattern.sub(replace, text)
+    missing = [originals[index - 1] for index in range(1, len(originals) + 1) if index not in found]
+    return restored_text, missing
@@ -1,33 +1,80 @@
 import json
 import os
-import pandas
 import re
+from contextlib import ExitStack
 from .properties import *
+from .model_routing import load_model_router, is_truncated_response
+from .translation_memory import TranslationMemory
+from .request_packing import is_packed_id, parse_packed_translations
+from .languages import get_language_file_path, get_prompt, tag_custom_id, split_custom_id
+from .placeholders import load_placeholders, restore_placeholders
+from .label_filter import SKIPPED_REQUEST_ID
+from .stf_document import read_document, COMMENT, ENTRY
+from .incremental import INCREMENTAL_SOURCE_FILE_PATH, get_source_file_path, append_carried_translations
 
 logger = get_logger(__file__)
+trace = TraceSampler(logger)
 
-translations = {}
-batchoutput = []
-html_tag_pattern = re.compile(r"<.*?>")
 special_character_patterm = re.compile(r"(\n|\t|\r)")
 
-with open(CHARACTER_LIMITS_FILE_PATH, "r", encoding=ENCODING) as file:
-    character_limits = json.load(file)
-logger.info(f"Archivo de límites de carácteres leído: {CHARACTER_LIMITS_FILE_PATH}")
+character_limits = None
 
-with open(KEYS_FILE_PATH, "r", encoding=ENCODING) as file:
-    keys = json.load(file)
-logger.info(f"Archivo de claves leído: {KEYS_FILE_PATH}")
+def load_static_resources():
+    global character_limits
+    if character_limits is not None:
+        return
 
-with open(METADATA_TYPES_FILE_PATH, "r", encoding=ENCODING) as file:
-    metadata_types = json.load(file)
-logger.info(f"Archivo de definición de metadatos leído: {METADATA_TYPES_FILE_PATH}")
+    with open(CHARACTER_LIMITS_FILE_PATH, "r", encoding=ENCODING) as file:
+        character_limits = json.load(file)
+    logger.info(f"Archivo de límites de carácteres leído: {CHARACTER_LIMITS_FILE_PATH}")
 
-def get_label_type(key):
-    for metadata_type, pattern in metadata_types.items():
-        if re.search(pattern, key):
-            return metadata_type
-    return "DEFAULT_LABEL_TYPE"
+def load_keys():
+    with open(KEYS_FILE_PATH, "r", encoding=ENCODING) as file:
+        keys = {key: custom_id for custom_id, request_keys in json.load(file).items() for key in request_keys}
+    logger.info(f"Archivo de claves leído: {KEYS_FILE_PATH}")
+    return keys
+
+def restore_translation(custom_id, translated_text, placeholders):
+    originals = placeholders.get(split_custom_id(custom_id)[1])
+    if not originals:
+        return translated_text
+    restored_text, missing = restore_placeholders(translated_text, originals)
+    if missing:
+        trace.trace("traducciones con placeholders perdidos", "La traducción del custom_id %s ha perdido los placeholders %s", custom_id, missing)
+        logger.warning(f"La traducción del custom_id {custom_id} no contiene {len(missing)} de {len(originals)} etiquetas o variables: {', '.join(missing)}")
+    return restored_text
+
+def read_translations(output_file_path, translations, fresh_ids=None, placeholders=None):
+    with open(output_file_path, "r", encoding=ENCODING) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            custom_id = item.get("custom_id")
+            try:
+                translated_text = item["response"]["body"]["choices"][0]["message"]["content"].rstrip()
+            except (KeyError, IndexError, TypeError) as e:
+                logger.error(f"Error al obtener la traducción para el custom_id {custom_id}: {e}")
+                continue
+            if is_truncated_response(item["response"]["body"]):
+                logger.error(f"La traducción del custom_id {custom_id} se ha cortado por max_tokens y no se usa")
+                continue
+            if is_packed_id(custom_id):
+                packed_translations = parse_packed_translations(translated_text)
+                if placeholders:
+                    packed_translations = {packed_id: restore_translation(packed_id, translation, placeholders) for packed_id, translation in packed_translations.items()}
+                translations.update(packed_translations)
+                if fresh_ids is not None:
+                    fresh_ids.update(packed_translations)
+                trace.trace("respuestas empaquetadas", "%s traducciones obtenidas de la respuesta empaquetada %s", len(packed_translations), custom_id)
+            elif translated_text:
+                translations[custom_id] = restore_translation(custom_id, translated_text, placeholders) if placeholders else translated_text
+                if fresh_ids is not None:
+                    fresh_ids.add(custom_id)
+                trace.trace("traducciones leídas", "Traducción obtenida para el custom_id %s", custom_id)
+            else:
+                logger.error(f"No existe traducción para el custom_id {custom_id}")
+    logger.info(f"Archivo de traducciones leído: {output_file_path}")
 
 def exceeds_char_limit(label_type, translated_label):
     char_limit = character_limits.get(label_type, character_limits["DEFAULT_LABEL_TYPE"])
@@ -36,75 +83,130 @@ def exceeds_char_limit(label_type, translated_label):
         return False
     return len(translated_label) > char_limit
 
-def write_long_translation_to_excel(key, original_label, translated_label, char_limit):
-    df = pandas.DataFrame([[key, original_label, translated_label, char_limit, len(translated_label)]], columns=["Key", "Original", "Traducido", "Límite de Carácteres", "Número de Carácteres"])
-    if os.path.exists(EXCEL_FILE_PATH):
-        existing_df = pandas.read_excel(EXCEL_FILE_PATH)
-        df = pandas.concat([existing_df, df]).drop_duplicates(subset=["Key"]).reset_index(drop=True)
-    df.to_excel(EXCEL_FILE_PATH, index=False)
-    logger.info(f"Escribiendo traducción larga en el archivo Excel: {EXCEL_FILE_PATH}")
+class LongTranslationsWriter:
+    COLUMNS = ["Key", "Original", "Traducido", "Límite de Carácteres", "Número de Carácteres"]
+
+    def __init__(self, excel_file_path=EXCEL_FILE_PATH, write_only_min_rows=EXCEL_WRITE_ONLY_MIN_ROWS_INT):
+        self.excel_file_path = excel_file_path
+        self.write_only_min_rows = write_only_min_rows
+        self.rows = {}
+
+    def add(self, key, original_label, translated_label, char_limit):
+        if key not in self.rows:
+            self.rows[key] = [key, original_label, translated_label, char_limit, len(translated_label)]
+
+    def write(self):
+        if not self.rows:
+            return
 
-logger.info("Iniciando la reconstrucción del archivo con las traducciones.")
+        import pandas
+        rows = self.rows
+        if os.path.exists(self.excel_file_path):
+            existing_rows = pandas.read_excel(self.excel_file_path).values.tolist()
+            rows = {row[0]: row for row in existing_rows}
+            for key, row in self.rows.items():
+                rows.setdefault(key, row)
+
+        if len(rows) >= self.write_only_min_rows:
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            worksheet = workbook.create_sheet()
+            worksheet.append(self.COLUMNS)
+            for row in rows.values():
+                worksheet.append(row)
+            workbook.save(self.excel_file_path)
+        else:
+            pandas.DataFrame(list(rows.values()), columns=self.COLUMNS).to_excel(self.excel_file_path, index=False)
+        logger.info(f"Escritas {len(self.rows)} traducciones largas en el archivo Excel: {self.excel_file_path}")
 
 def replace_special_characters(text):
     return re.sub(special_character_patterm, lambda match: {"\n": "\\n", "\t": "\\t", "\r": "\\r"}[match.group()], text)
 
 def process_batch_output():
-    if not os.path.exists(BATCH_OUTPUT_FILE_PATH):
-        logger.error(f"No se ha encontrado el archivo resultante del batch \"{BATCH_OUTPUT_FILE_PATH}\"")
+    output_file_paths = get_file_parts(BATCH_OUTPUT_ROOT)
+    if os.path.exists(BATCH_OUTPUT_FILE_PATH):
+        output_file_paths.append(BATCH_OUTPUT_FILE_PATH)
+
+    if not output_file_paths and not os.path.exists(CACHED_OUTPUT_FILE_PATH) and not os.path.exists(INCREMENTAL_SOURCE_FILE_PATH):
+        logger.error(f"No se han encontrado resultados del batch en \"{BATCH_OUTPUT_ROOT}\" ni en \"{BATCH_OUTPUT_FILE_PATH}\"")
         return False
 
-    with open(BATCH_OUTPUT_FILE_PATH, "r", encoding=ENCODING) as file:
-        for line in file:
-            batchoutput.append(json.loads(line))
-    logger.info(f"Archivo de batch output leído: {BATCH_OUTPUT_FILE_PATH}")
-
-    for item in batchoutput:
-        try:
-            custom_id = item["custom_id"]
-            translated_text = item["response"]["body"]["choices"][0]["message"]["content"].rstrip()
-            if translated_text:
-                translations[custom_id] = translated_text
-                logger.debug(f"Traducción obtenida para el custom_id {custom_id}")
-            else:
-                logger.error(f"No existe traducción para el custom_id {custom_id}")
-        except KeyError as e:
-            logger.error(f"Error al obtener la traducción para el custom_id {custom_id}: {e}")
-    
+    logger.info("Iniciando la reconstrucción del archivo con las traducciones.")
+    trace.reset()
+    load_static_resources()
+    keys = load_keys()
+    placeholders = load_placeholders() if USE_PLACEHOLDER_MASKING else {}
+
+    translations = {}
+    fresh_ids = set()
+    for output_file_path in output_file_paths:
+        read_translations(output_file_path, translations, fresh_ids, placeholders)
+    if os.path.exists(CACHED_OUTPUT_FILE_PATH):
+        read_translations(CACHED_OUTPUT_FILE_PATH, translations)
+
     os.makedirs(os.path.dirname(TRANSLATED_FILE_PATH), exist_ok=True)
-    if not os.path.exists(SOURCE_FILE_PATH):
-        logger.error(f"No se ha encontrado el archivo de entrada en {SOURCE_FILE_PATH}")
+    source_file_path = get_source_file_path()
+    if not os.path.exists(source_file_path):
+        logger.error(f"No se ha encontrado el archivo de entrada en {source_file_path}")
         return False
     
-    with open(SOURCE_FILE_PATH, "r", encoding=ENCODING) as infile, open(TRANSLATED_FILE_PATH, "w", encoding=ENCODING) as outfile:
-        for line in infile:
-            if line.startswith("#"):
-                outfile.write(line)
-                logger.debug(f"Escribiendo línea no traducible: {line.rstrip()}")
+    translated_file_paths = {language_code: get_language_file_path(TRANSLATED_FILE_PATH, language_code) for language_code in TRANSLATION_LANGUAGES}
+    long_translations = {language_code: LongTranslationsWriter(get_language_file_path(EXCEL_FILE_PATH, language_code)) for language_code in TRANSLATION_LANGUAGES}
+    prompts = {language_code: get_prompt(language) for language_code, language in TRANSLATION_LANGUAGES.items()}
+    translation_memory = TranslationMemory() if USE_TRANSLATION_MEMORY else None
+    router = load_model_router(character_limits) if translation_memory else None
+    with ExitStack() as stack:
+        outfiles = {language_code: stack.enter_context(open(file_path, "w", encoding=ENCODING)) for language_code, file_path in translated_file_paths.items()}
+        for record in read_document(source_file_path):
+            line = record.line
+            if record.kind == COMMENT:
+                for outfile in outfiles.values():
+                    outfile.write(line)
+                trace.trace("líneas comentadas", "Escribiendo línea comentada: %s", line.rstrip())
                 continue
-            parts = line.split("\t", 1)
-            if len(parts) == 2:
-                key, label = parts
+            if record.kind == ENTRY:
+                key, label = record.key, record.label
                 if key not in keys:
-                    logger.warning(f"La key \"{key}\" no está dentro de {KEYS_FILE_PATH}")
+                    logger.warning("La key \"%s\" no está dentro de %s", key, KEYS_FILE_PATH)
                     continue
                 request_id = keys[key]
-
-                if request_id not in translations:
-                    logger.warning(f"La key \"{request_id}\" no tiene traducción asociada")
+                if request_id == SKIPPED_REQUEST_ID:
+                    if LABEL_FILTER_MODE == "copy":
+                        for outfile in outfiles.values():
+                            outfile.write(line.rstrip("\r\n") + "\n")
+                    trace.trace("labels no traducibles filtrados", "Label no traducible de la key %s %s", key, "copiado" if LABEL_FILTER_MODE == "copy" else "omitido")
                     continue
-                translated_label = replace_special_characters(translations[request_id])
-                label_type = get_label_type(key)
-                if exceeds_char_limit(label_type, translated_label):
-                    char_limit = character_limits[label_type]
-                    write_long_translation_to_excel(key, label, translated_label, char_limit)
-                    logger.debug(f"Escribiendo traducción larga en el Excel para key {key}")
-                else:
-                    outfile.write(f"{key}\t{translated_label}\n")
-                    logger.debug(f"Escribiendo línea traducida para key {key}: {translated_label}")
+                label_type = record.metadata_type
+
+                for language_code, outfile in outfiles.items():
+                    custom_id = tag_custom_id(request_id, language_code)
+                    if custom_id not in translations:
+                        logger.warning("La key \"%s\" no tiene traducción asociada", custom_id)
+                        continue
+                    if translation_memory and custom_id in fresh_ids:
+                        translation_memory.put(label.rstrip(), translations[custom_id], TRANSLATION_LANGUAGES[language_code], prompts[language_code], router.get_route(key, label_type=label_type).model)
+                        fresh_ids.discard(custom_id)
+                    translated_label = replace_special_characters(translations[custom_id])
+                    if exceeds_char_limit(label_type, translated_label):
+                        char_limit = character_limits.get(label_type, character_limits["DEFAULT_LABEL_TYPE"])
+                        long_translations[language_code].add(key, label, translated_label, char_limit)
+                        trace.trace("traducciones largas", "Escribiendo traducción larga (%s) en el Excel para key %s", language_code, key)
+                    else:
+                        outfile.write(f"{key}\t{translated_label}\n")
+                        trace.trace("líneas traducidas", "Escribiendo línea traducida (%s) para key %s: %s", language_code, key, translated_label)
             else:
-                outfile.write(line)
-                logger.debug(f"Escribiendo línea no traducible: {line.rstrip()}")
+                for outfile in outfiles.values():
+                    outfile.write(line)
+                trace.trace("líneas no traducibles", "Escribiendo línea no traducible: %s", line.rstrip())
+
+        for language_code, outfile in outfiles.items():
+            append_carried_translations(language_code, outfile)
 
-    logger.info(f"Archivo traducido guardado en: {TRANSLATED_FILE_PATH}")
+    trace.summary("Resumen de la reconstrucción")
+    for file_path in translated_file_paths.values():
+        logger.info(f"Archivo traducido guardado en: {file_path}")
+    if translation_memory:
+        translation_memory.close()
+    for writer in long_translations.values():
+        writer.write()
     return True
\ No newline at end of file
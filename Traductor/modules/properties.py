@@ -1,14 +1,18 @@
-import psutil
+import atexit
 import json
 import configparser
 import logging
+import queue
 from logging import FileHandler
+from logging.handlers import QueueHandler, QueueListener
 import os
 import shutil
 from datetime import datetime
 
 package_root_path = None
 working_dir_path = None
+log_handler = None
+log_listener = None
 
 def set_main_directory(f):
     global package_root_path, working_dir_path
@@ -21,42 +25,144 @@ def set_main_directory(f):
     working_dir_path = os.path.dirname(directory)
     init_config()
 
+def set_working_directory(directory):
+    global working_dir_path
+
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+
+    working_dir_path = directory
+    init_config()
+
+def set_output_root(directory):
+    global OUTPUT_DIR_NAME
+
+    OUTPUT_DIR_NAME = os.path.abspath(directory)
+    return prepare_dirs()
+
 def init_config():
     global RESOURCES_ROOT, STATIC_RESOURCES_ROOT, LOG_ROOT, WRONG_KEY_TEXT, WRONG_FLOW_TYPE1, WRONG_FLOW_TYPE2
     global ENCODING, MODEL_NAME, PROMPT, KEYS_FILE_PATH, BATCH_OUTPUT_FILE_PATH, CHARACTER_LIMITS_FILE_PATH
-    global METADATA_TYPES_FILE_PATH, BATCH_DATA_ROOT, MAX_BATCH_INPUT_LINES_INT, STATE_FILE, API_KEY
-    global INPUT_DIR_NAME, OUTPUT_DIR_NAME, SOURCE_FILE_NAME, TRANSLATED_FILE_NAME, EXCEL_FILE_NAME, CONFIGURATION_FILE_PATH
+    global METADATA_TYPES_FILE_PATH, BATCH_DATA_ROOT, MAX_BATCH_INPUT_LINES_INT, STATE_FILE, API_KEY, EXCEL_WRITE_ONLY_MIN_ROWS_INT
+    global INPUT_DIR_NAME, OUTPUT_DIR_NAME, DEFAULT_OUTPUT_DIR_NAME, SOURCE_FILE_NAME, TRANSLATED_FILE_NAME, EXCEL_FILE_NAME, CONFIGURATION_FILE_PATH
     global DUPLICATED_KEYS_FILE_NAME, UNTRANSLATABLE_LINES_FILE_NAME, INPUT_ROOT, OUTPUT_ROOT, SOURCE_FILE_PATH
     global TRANSLATED_FILE_PATH, EXCEL_FILE_PATH, DUPLICATED_KEYS_FILE_PATH, UNTRANSLATABLE_LINES_FILE_PATH
+    global SOURCE_LANGUAGE, TRANSLATION_LANGUAGE, USE_TRANSLATION_MEMORY, TRANSLATION_MEMORY_FILE_PATH
+    global TRANSLATION_MEMORY_MAX_ENTRIES_INT, CACHED_OUTPUT_FILE_PATH, MAX_CONCURRENT_BATCHES_INT, MAX_ENQUEUED_TOKENS_INT
+    global BATCH_RETRY_LIMIT_INT, BATCH_OUTPUT_ROOT, USE_REQUEST_PACKING, PACKING_PROMPT, PACKING_MAX_TOKENS_INT
+    global PACKING_MAX_LABEL_TOKENS_INT, MAX_BATCH_INPUT_TOKENS_INT, MAX_BATCH_INPUT_BYTES_INT, TRANSLATION_LANGUAGES
+    global PROMPT_TEMPLATE, PACKING_PROMPT_TEMPLATE, INCREMENTAL_ROOT, STF_INDEX_ROOT
+    global LOG_LEVEL, LOG_STAGE_LEVELS, LOG_TRACE_SAMPLE_EVERY_INT
+    global OPENAI_BASE_URL, BATCH_POLL_MIN_WAIT_INT, BATCH_POLL_MAX_WAIT_INT
+    global BATCH_INPUT_TOKEN_PRICE_FLOAT, BATCH_OUTPUT_TOKEN_PRICE_FLOAT, BATCH_MODEL_TOKEN_PRICES
+    global TRANSLATION_MODE, REALTIME_MAX_REQUESTS_INT, TRANSLATION_DEADLINE_MINUTES_INT, BATCH_EXPECTED_MINUTES_INT
+    global REALTIME_MAX_CONCURRENCY_INT, REALTIME_REQUESTS_PER_MINUTE_INT, REALTIME_TOKENS_PER_MINUTE_INT
+    global REALTIME_MAX_RETRIES_INT, REALTIME_MAX_BACKOFF_SECONDS_INT, USE_MODEL_ROUTING, MODEL_ROUTING_FILE_PATH
+    global PLACEHOLDER_HTML5, PLACEHOLDER_VARIABLE, USE_PLACEHOLDER_MASKING, PLACEHOLDERS_FILE_PATH
+    global USE_LABEL_FILTER, LABEL_FILTER_MODE, LABEL_FILTER_LANGUAGE_DETECTION
 
     CONFIGURATION_FILE_PATH = os.path.join(package_root_path, "resources/static/config.properties")
     CONFIGURATION_SETTINGS = "DEFAULT"
+    CONFIGURATION_ENVIRONMENT_PREFIX = "TRADUCTOR_"
 
     configuration = configparser.ConfigParser()
     configuration.read(CONFIGURATION_FILE_PATH)
     default_configuration = configuration[CONFIGURATION_SETTINGS]
+    for name, value in os.environ.items():
+        if name.startswith(CONFIGURATION_ENVIRONMENT_PREFIX):
+            default_configuration[name[len(CONFIGURATION_ENVIRONMENT_PREFIX):]] = value
 
     RESOURCES_ROOT = default_configuration["RESOURCES_ROOT"]
-    STATIC_RESOURCES_ROOT = default_configuration["STATIC_RESOURCES_ROOT"]
+    STATIC_RESOURCES_ROOT = os.path.join(package_root_path, default_configuration["STATIC_RESOURCES_ROOT"])
     LOG_ROOT = default_configuration["LOG_ROOT"]
+    LOG_LEVEL = default_configuration["LOG_LEVEL"].strip().upper()
+    LOG_TRACE_SAMPLE_EVERY_INT = max(1, int(default_configuration["LOG_TRACE_SAMPLE_EVERY"]))
+
+    LOG_STAGE_LEVELS = {}
+    for stage_level in default_configuration["LOG_STAGE_LEVELS"].split(","):
+        stage, _, level = stage_level.partition(":")
+        if stage.strip():
+            LOG_STAGE_LEVELS[stage.strip()] = level.strip().upper()
     WRONG_KEY_TEXT = default_configuration["WRONG_KEY_TEXT"]
     WRONG_FLOW_TYPE1 = default_configuration["WRONG_FLOW_TYPE1"]
     WRONG_FLOW_TYPE2 = default_configuration["WRONG_FLOW_TYPE2"]
     ENCODING = default_configuration["ENCODING"]
     MODEL_NAME = default_configuration["MODEL_NAME"]
     PROMPT = default_configuration["PROMPT"]
+    SOURCE_LANGUAGE = default_configuration["SOURCE_LANGUAGE"]
+    TRANSLATION_LANGUAGE = default_configuration["TRANSLATION_LANGUAGE"]
+    PACKING_PROMPT = default_configuration["PACKING_PROMPT"]
+    PROMPT_TEMPLATE = default_configuration.get("PROMPT", raw=True)
+    PACKING_PROMPT_TEMPLATE = default_configuration.get("PACKING_PROMPT", raw=True)
+
+    TRANSLATION_LANGUAGES = {}
+    for language in default_configuration["TRANSLATION_LANGUAGES"].split(","):
+        language_code, _, language_name = language.partition(":")
+        TRANSLATION_LANGUAGES[language_code.strip()] = language_name.strip()
 
     KEYS_FILE_PATH = default_configuration["KEYS_FILE_PATH"]
+    PLACEHOLDERS_FILE_PATH = default_configuration["PLACEHOLDERS_FILE_PATH"]
     BATCH_OUTPUT_FILE_PATH = default_configuration["BATCH_OUTPUT_FILE_PATH"]
-    CHARACTER_LIMITS_FILE_PATH = default_configuration["CHARACTER_LIMITS_FILE_PATH"]
-    METADATA_TYPES_FILE_PATH = default_configuration["METADATA_TYPES_FILE_PATH"]
+    CHARACTER_LIMITS_FILE_PATH = os.path.join(package_root_path, default_configuration["CHARACTER_LIMITS_FILE_PATH"])
+    METADATA_TYPES_FILE_PATH = os.path.join(package_root_path, default_configuration["METADATA_TYPES_FILE_PATH"])
+    MODEL_ROUTING_FILE_PATH = os.path.join(package_root_path, default_configuration["MODEL_ROUTING_FILE_PATH"])
     BATCH_DATA_ROOT = default_configuration["BATCH_DATA_ROOT"]
+    BATCH_OUTPUT_ROOT = default_configuration["BATCH_OUTPUT_ROOT"]
+    INCREMENTAL_ROOT = default_configuration["INCREMENTAL_ROOT"]
+    STF_INDEX_ROOT = default_configuration["STF_INDEX_ROOT"]
     MAX_BATCH_INPUT_LINES_INT = int(default_configuration["MAX_BATCH_INPUT_LINES"])
+    MAX_BATCH_INPUT_TOKENS_INT = int(default_configuration["MAX_BATCH_INPUT_TOKENS"])
+    MAX_BATCH_INPUT_BYTES_INT = int(default_configuration["MAX_BATCH_INPUT_BYTES"])
+    BATCH_INPUT_TOKEN_PRICE_FLOAT = float(default_configuration["BATCH_INPUT_TOKEN_PRICE"])
+    BATCH_OUTPUT_TOKEN_PRICE_FLOAT = float(default_configuration["BATCH_OUTPUT_TOKEN_PRICE"])
+    BATCH_MODEL_TOKEN_PRICES = {}
+    for model_prices in default_configuration["BATCH_MODEL_TOKEN_PRICES"].split(","):
+        model, _, prices = model_prices.partition(":")
+        if model.strip():
+            input_price, _, output_price = prices.partition("/")
+            BATCH_MODEL_TOKEN_PRICES[model.strip()] = (float(input_price), float(output_price))
+    MAX_CONCURRENT_BATCHES_INT = int(default_configuration["MAX_CONCURRENT_BATCHES"])
+    MAX_ENQUEUED_TOKENS_INT = int(default_configuration["MAX_ENQUEUED_TOKENS"])
+    BATCH_RETRY_LIMIT_INT = int(default_configuration["BATCH_RETRY_LIMIT"])
     STATE_FILE = default_configuration["STATE_FILE"]
+    EXCEL_WRITE_ONLY_MIN_ROWS_INT = int(default_configuration["EXCEL_WRITE_ONLY_MIN_ROWS"])
     API_KEY = default_configuration["API_KEY"]
+    OPENAI_BASE_URL = default_configuration["OPENAI_BASE_URL"].strip() or None
+    BATCH_POLL_MIN_WAIT_INT = int(default_configuration["BATCH_POLL_MIN_WAIT"])
+    BATCH_POLL_MAX_WAIT_INT = int(default_configuration["BATCH_POLL_MAX_WAIT"])
+
+    TRANSLATION_MODE = default_configuration["TRANSLATION_MODE"].strip().lower()
+    REALTIME_MAX_REQUESTS_INT = int(default_configuration["REALTIME_MAX_REQUESTS"])
+    TRANSLATION_DEADLINE_MINUTES_INT = int(default_configuration["TRANSLATION_DEADLINE_MINUTES"])
+    BATCH_EXPECTED_MINUTES_INT = int(default_configuration["BATCH_EXPECTED_MINUTES"])
+    REALTIME_MAX_CONCURRENCY_INT = int(default_configuration["REALTIME_MAX_CONCURRENCY"])
+    REALTIME_REQUESTS_PER_MINUTE_INT = int(default_configuration["REALTIME_REQUESTS_PER_MINUTE"])
+    REALTIME_TOKENS_PER_MINUTE_INT = int(default_configuration["REALTIME_TOKENS_PER_MINUTE"])
+    REALTIME_MAX_RETRIES_INT = int(default_configuration["REALTIME_MAX_RETRIES"])
+    REALTIME_MAX_BACKOFF_SECONDS_INT = int(default_configuration["REALTIME_MAX_BACKOFF_SECONDS"])
+
+    USE_TRANSLATION_MEMORY = default_configuration.getboolean("USE_TRANSLATION_MEMORY")
+    TRANSLATION_MEMORY_FILE_PATH = default_configuration["TRANSLATION_MEMORY_FILE_PATH"]
+    TRANSLATION_MEMORY_MAX_ENTRIES_INT = int(default_configuration["TRANSLATION_MEMORY_MAX_ENTRIES"])
+    CACHED_OUTPUT_FILE_PATH = default_configuration["CACHED_OUTPUT_FILE_PATH"]
+
+    USE_REQUEST_PACKING = default_configuration.getboolean("USE_REQUEST_PACKING")
+    PACKING_MAX_TOKENS_INT = int(default_configuration["PACKING_MAX_TOKENS"])
+    PACKING_MAX_LABEL_TOKENS_INT = int(default_configuration["PACKING_MAX_LABEL_TOKENS"])
+
+    USE_MODEL_ROUTING = default_configuration.getboolean("USE_MODEL_ROUTING")
+
+    USE_PLACEHOLDER_MASKING = default_configuration.getboolean("USE_PLACEHOLDER_MASKING")
+    PLACEHOLDER_HTML5 = default_configuration["PLACEHOLDER_HTML5"]
+    PLACEHOLDER_VARIABLE = default_configuration["PLACEHOLDER_VARIABLE"]
+
+    USE_LABEL_FILTER = default_configuration.getboolean("USE_LABEL_FILTER")
+    LABEL_FILTER_MODE = default_configuration["LABEL_FILTER_MODE"].strip().lower()
+    LABEL_FILTER_LANGUAGE_DETECTION = default_configuration.getboolean("LABEL_FILTER_LANGUAGE_DETECTION")
 
     INPUT_DIR_NAME = default_configuration["INPUT_DIR_NAME"]
-    OUTPUT_DIR_NAME = default_configuration["OUTPUT_DIR_NAME"]
+    OUTPUT_DIR_NAME = DEFAULT_OUTPUT_DIR_NAME = default_configuration["OUTPUT_DIR_NAME"]
     SOURCE_FILE_NAME = default_configuration["SOURCE_FILE_NAME"]
     TRANSLATED_FILE_NAME = default_configuration["TRANSLATED_FILE_NAME"]
     EXCEL_FILE_NAME = default_configuration["EXCEL_FILE_NAME"]
@@ -67,18 +173,63 @@ def init_config():
 
 def get_logger(script_path):
     script_name = os.path.splitext(os.path.basename(script_path))[0]
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-    logger.propagate = False
+    return logging.getLogger(script_name)
+
+def init_logging(script_path):
+    global log_handler, log_listener
+    if log_handler:
+        return log_handler
 
+    script_name = os.path.splitext(os.path.basename(script_path))[0]
+    root_logger = logging.getLogger()
+    root_logger.setLevel(LOG_LEVEL)
+    for stage, level in LOG_STAGE_LEVELS.items():
+        logging.getLogger(stage).setLevel(level)
 
     current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = os.path.join(LOG_ROOT, f"{script_name}_{current_time}.log")
     file_handler = FileHandler(log_file, encoding=ENCODING)
-    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(message)s"))
-    logger.addHandler(file_handler)
-
-    return logger
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(threadName)s - %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    log_listener = QueueListener(log_queue, file_handler)
+    log_listener.start()
+    log_handler = QueueHandler(log_queue)
+    root_logger.addHandler(log_handler)
+    atexit.register(stop_logging)
+
+    return log_handler
+
+def stop_logging():
+    global log_handler, log_listener
+    if not log_handler:
+        return
+
+    logging.getLogger().removeHandler(log_handler)
+    log_listener.stop()
+    for handler in log_listener.handlers:
+        handler.close()
+    log_handler = None
+    log_listener = None
+
+class TraceSampler:
+    def __init__(self, logger, sample_every=None):
+        self.logger = logger
+        self.sample_every = sample_every or LOG_TRACE_SAMPLE_EVERY_INT
+        self.counts = {}
+
+    def reset(self):
+        self.counts.clear()
+
+    def trace(self, event, message, *args):
+        count = self.counts.get(event, 0) + 1
+        self.counts[event] = count
+        if (count - 1) % self.sample_every == 0 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"[{count}] {message}", *args)
+
+    def summary(self, title):
+        if self.counts:
+            self.logger.info("%s: %s", title, ", ".join(f"{count} {event}" for event, count in self.counts.items()))
 
 def get_file_parts(directory):
     jsonl_files = []
@@ -91,6 +242,9 @@ def get_file_parts(directory):
 def clean_all():
     clean_state()
     clean_root(BATCH_DATA_ROOT)
+    clean_root(BATCH_OUTPUT_ROOT)
+    clean_root(INCREMENTAL_ROOT)
+    clean_root(STF_INDEX_ROOT)
 
 def clean_root(root_dir):
     def remove_file(file_path, n_try=0):
@@ -111,6 +265,8 @@ def clean_root(root_dir):
             remove_file(file_path)
 
 def handle_permission_error(file_path):
+    import psutil
+
     for proc in psutil.process_iter(['pid', 'name', 'open_files']):
         try:
             open_files = proc.info['open_files']
@@ -126,23 +282,20 @@ def handle_permission_error(file_path):
 
     
 def clean_state():
-    files_to_remove = [STATE_FILE, BATCH_OUTPUT_FILE_PATH, KEYS_FILE_PATH]
+    files_to_remove = [STATE_FILE, BATCH_OUTPUT_FILE_PATH, KEYS_FILE_PATH, PLACEHOLDERS_FILE_PATH, CACHED_OUTPUT_FILE_PATH]
     
     for file in files_to_remove:
         if os.path.exists(file):
             os.remove(file)
 
-def save_state(processed_parts):
-    with open(STATE_FILE, "w") as state_file:
-        json.dump(processed_parts, state_file)
+def save_state(state):
+    temporary_state_file = STATE_FILE + ".tmp"
+    with open(temporary_state_file, "w") as state_file:
+        json.dump(state, state_file, indent=4)
+    os.replace(temporary_state_file, STATE_FILE)
 
 def save_backup():
-    root_logger = logging.getLogger()
-    handlers = root_logger.handlers[:]
-    for handler in handlers:
-        if isinstance(handler, FileHandler):
-            handler.close()
-            root_logger.removeHandler(handler)
+    stop_logging()
     
     now = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
     backup_dir = os.path.join(working_dir_path, f"backup_{now}")
@@ -154,6 +307,7 @@ def save_backup():
             return f"Ha ocurrido un error al intentar eliminar el directorio \"{backup_dir}\" para crear uno nuevo: {e}"
 
     os.makedirs(backup_dir)
+    absolute_translation_memory_path = os.path.abspath(TRANSLATION_MEMORY_FILE_PATH)
 
     for root, _, files in os.walk(package_root_path):
         for file in files:
@@ -162,6 +316,9 @@ def save_backup():
             if file.endswith(".py"):
                 continue
 
+            if os.path.abspath(full_path).startswith(absolute_translation_memory_path):
+                continue
+
             relative_path = os.path.relpath(full_path, package_root_path)
             backup_path = os.path.join(backup_dir, relative_path)
 
@@ -187,6 +344,23 @@ def save_backup():
                 except Exception as e:
                     return f"Ha ocurrido un error inesperado al mover el archivo {full_path} a {backup_path}\n{e}"
 
+    absolute_package_root = os.path.abspath(package_root_path)
+    for root_dir, directory_name in ((INPUT_ROOT, INPUT_DIR_NAME), (OUTPUT_ROOT, DEFAULT_OUTPUT_DIR_NAME)):
+        absolute_root_dir = os.path.abspath(root_dir)
+        if os.path.commonpath([absolute_root_dir, absolute_package_root]) == absolute_package_root:
+            continue
+        for root, _, files in os.walk(absolute_root_dir):
+            for file in files:
+                full_path = os.path.join(root, file)
+                backup_path = os.path.join(backup_dir, directory_name, os.path.relpath(full_path, absolute_root_dir))
+                os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+                try:
+                    shutil.copy2(full_path, backup_path)
+                except PermissionError:
+                    return f"Ha ocurrido un error de permisos al copiar el archivo {full_path} a {backup_path}"
+                except Exception as e:
+                    return f"Ha ocurrido un error inesperado al copiar el archivo {full_path} a {backup_path}\n{e}"
+
     return f"Copia de seguridad creada en {backup_dir}"
 
 def prepare_dirs():
@@ -205,6 +379,9 @@ def prepare_dirs():
         required_dirs = [
             RESOURCES_ROOT, 
             BATCH_DATA_ROOT,
+            BATCH_OUTPUT_ROOT,
+            INCREMENTAL_ROOT,
+            STF_INDEX_ROOT,
             LOG_ROOT,
             INPUT_ROOT, 
             OUTPUT_ROOT
@@ -213,7 +390,8 @@ def prepare_dirs():
         required_files = [
             CHARACTER_LIMITS_FILE_PATH, 
             CONFIGURATION_FILE_PATH, 
-            METADATA_TYPES_FILE_PATH
+            METADATA_TYPES_FILE_PATH,
+            MODEL_ROUTING_FILE_PATH
         ]
         
         for directory in required_dirs:
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import random
+import time
+from .properties import *
+from .generate_batch_input import estimate_request_tokens
+from .request_packing import is_packed_id, get_packed_labels, get_response_content, parse_packed_translations
+from .model_routing import is_truncated_response
+from .export_batch import PROCESSED_STATUS, load_state, get_part_output_path, create_unpacked_requests, create_retry_part, get_export_result
+
+logger = get_logger(__file__)
+trace = TraceSampler(logger)
+
+class TokenBucket:
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+def count_requests(file_parts, max_requests=None):
+    request_count = 0
+    token_count = 0
+    for file_part in file_parts:
+        with open(file_part, "r", encoding=ENCODING) as file:
+            for line in file:
+                if line.strip():
+                    request = json.loads(line)
+                    input_tokens, _ = estimate_request_tokens(request)
+                    request_count += 1
+                    token_count += input_tokens + request["body"]["max_tokens"]
+                    if max_requests is not None and request_count > max_requests:
+                        return request_count, token_count
+    return request_count, token_count
+
+def choose_translation_mode(file_parts):
+    if TRANSLATION_MODE != "auto":
+        return TRANSLATION_MODE
+
+    # Sin un plazo más corto que el de un batch solo importa si se supera REALTIME_MAX_REQUESTS, así que no
+    # hace falta leer el resto de solicitudes.
+    has_deadline = 0 < TRANSLATION_DEADLINE_MINUTES_INT < BATCH_EXPECTED_MINUTES_INT
+    request_count, token_count = count_requests(file_parts, None if has_deadline else REALTIME_MAX_REQUESTS_INT)
+    if not has_deadline and request_count > REALTIME_MAX_REQUESTS_INT:
+        logger.info(f"Modo de traducción batch: más de {REALTIME_MAX_REQUESTS_INT} solicitudes")
+        return "batch"
+
+    realtime_minutes = max(request_count / REALTIME_REQUESTS_PER_MINUTE_INT, token_count / REALTIME_TOKENS_PER_MINUTE_INT)
+    if request_count <= REALTIME_MAX_REQUESTS_INT:
+        mode = "realtime"
+    elif has_deadline and realtime_minutes <= TRANSLATION_DEADLINE_MINUTES_INT:
+        mode = "realtime"
+    else:
+        mode = "batch"
+    logger.info(f"Modo de traducción {mode}: {request_count} solicitudes, ~{token_count} tokens, ~{realtime_minutes:.1f} minutos estimados en tiempo real")
+    return mode
+
+def get_retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class RealtimeTranslator:
+    def __init__(self, is_cancelled=lambda: False, max_concurrency=REALTIME_MAX_CONCURRENCY_INT, max_retries=REALTIME_MAX_RETRIES_INT):
+        self.is_cancelled = is_cancelled
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(REALTIME_REQUESTS_PER_MINUTE_INT)
+        self.token_bucket = TokenBucket(REALTIME_TOKENS_PER_MINUTE_INT)
+        self.client = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.truncated = 0
+
+    async def send(self, request):
+        import openai
+
+        body = request["body"]
+        input_tokens, _ = estimate_request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(input_tokens + body["max_tokens"])
+            try:
+                completion = await self.client.chat.completions.create(**body)
+                return completion.model_dump(exclude_none=True)
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                if attempt == self.max_retries:
+                    logger.error(f"La solicitud {request['custom_id']} ha fallado después de {attempt + 1} intentos: {e}")
+                    return None
+                wait_time = get_retry_after(e) or min(REALTIME_MAX_BACKOFF_SECONDS_INT, 2 ** attempt) * random.uniform(0.5, 1.5)
+                self.retried += 1
+                trace.trace("reintentos", "Reintento %s de la solicitud %s en %.1f segundos: %s", attempt + 1, request["custom_id"], wait_time, e)
+                await asyncio.sleep(wait_time)
+            except openai.APIStatusError as e:
+                logger.error(f"La solicitud {request['custom_id']} ha sido rechazada: {e}")
+                return None
+
+    async def translate(self, request, output_file, succeeded_ids):
+        response_body = await self.send(request)
+        if response_body is None:
+            self.failed += 1
+            return
+
+        custom_id = request["custom_id"]
+        if is_truncated_response(response_body) and not is_packed_id(custom_id):
+            self.truncated += 1
+            trace.trace("respuestas cortadas por max_tokens", "La respuesta de la solicitud %s se ha cortado por max_tokens", custom_id)
+            return
+        if is_packed_id(custom_id):
+            expected_ids = set(get_packed_labels(request))
+            translations = parse_packed_translations(get_response_content(response_body), expected_ids)
+            if len(translations) < len(expected_ids):
+                trace.trace("respuestas empaquetadas incompletas", "La respuesta empaquetada %s solo contiene %s/%s traducciones válidas", custom_id, len(translations), len(expected_ids))
+                for single_request in create_unpacked_requests(request, translations):
+                    await self.translate(single_request, output_file, succeeded_ids)
+            if not translations:
+                return
+            succeeded_ids.update(translations)
+            response_body["choices"][0]["message"]["content"] = json.dumps(translations, ensure_ascii=False)
+        else:
+            succeeded_ids.add(custom_id)
+
+        output_file.write(json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": response_body}, "error": None}, ensure_ascii=False) + "\n")
+        self.completed += 1
+
+    async def worker(self, queue, output_file, succeeded_ids):
+        while True:
+            request = await queue.get()
+            try:
+                if request is not None and not self.is_cancelled():
+                    await self.translate(request, output_file, succeeded_ids)
+            finally:
+                queue.task_done()
+            if request is None:
+                return
+
+    async def translate_part(self, file_part):
+        output_path = get_part_output_path(file_part)
+        temporary_output_path = output_path + ".tmp"
+        queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        succeeded_ids = set()
+        with open(temporary_output_path, "w", encoding=ENCODING) as output_file:
+            workers = [asyncio.create_task(self.worker(queue, output_file, succeeded_ids)) for _ in range(self.max_concurrency)]
+            with open(file_part, "r", encoding=ENCODING) as file:
+                for line in file:
+                    if self.is_cancelled():
+                        break
+                    if line.strip():
+                        await queue.put(json.loads(line))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        if self.is_cancelled():
+            os.remove(temporary_output_path)
+            return None, succeeded_ids
+        os.replace(temporary_output_path, output_path)
+        return output_path, succeeded_ids
+
+    async def run(self, file_parts, state, progress_bar):
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+        try:
+            progress_step = 30 / len(file_parts)
+            pending_parts = list(file_parts)
+            while pending_parts:
+                file_part = pending_parts.pop(0)
+                part_state = state.setdefault(file_part, {})
+                if part_state.get("status") == PROCESSED_STATUS:
+                    continue
+                output_path, succeeded_ids = await self.translate_part(file_part)
+                if output_path is None:
+                    logger.warning("Traducción en tiempo real cancelada")
+                    return False
+                part_state.update({"output_file": output_path, "mode": "realtime"})
+                retry_part = create_retry_part(file_part, succeeded_ids, state)
+                if retry_part:
+                    pending_parts.append(retry_part)
+                part_state["status"] = PROCESSED_STATUS
+                save_state(state)
+                progress_bar.update(min(90, progress_bar.progress.get() + progress_step), f"Archivo {file_part} traducido en tiempo real")
+        finally:
+            await self.client.close()
+        return True
+
+def translate_realtime(file_parts, progress_bar, is_cancelled=lambda: False):
+    state = load_state()
+    translator = RealtimeTranslator(is_cancelled)
+    trace.reset()
+    start_time = time.time()
+    progress_bar.update(progress_bar.progress.get(), f"Traduciendo {len(file_parts)} archivos en tiempo real")
+    result = asyncio.run(translator.run(file_parts, state, progress_bar))
+    trace.summary("Resumen de la traducción en tiempo real")
+    logger.info(f"Traducción en tiempo real: {translator.completed} respuestas, {translator.failed} solicitudes fallidas, {translator.truncated} respuestas cortadas por max_tokens y {translator.retried} reintentos en {time.time() - start_time:.1f} segundos")
+    return get_export_result(state) if result else False
@@ -0,0 +1,92 @@
+import json
+from .properties import *
+from .languages import split_custom_id, tag_custom_id
+
+PACKED_ID_PREFIX = "packed-"
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def is_packed_id(custom_id):
+    return split_custom_id(custom_id)[1].startswith(PACKED_ID_PREFIX)
+
+def create_packed_request(labels, custom_id, prompt=PACKING_PROMPT, model=MODEL_NAME):
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": prompt
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps(labels, ensure_ascii=False)
+                }
+            ],
+            "response_format": {
+                "type": "json_object"
+            },
+            "max_tokens": 4 * PACKING_MAX_TOKENS_INT
+        }
+    }
+
+def get_packed_labels(request):
+    return json.loads(request["body"]["messages"][1]["content"])
+
+def get_response_content(body):
+    try:
+        return body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def parse_packed_translations(content, expected_ids=None):
+    try:
+        translations = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(translations, dict):
+        return {}
+    return {
+        custom_id: translation.rstrip()
+        for custom_id, translation in translations.items()
+        if isinstance(translation, str) and translation.strip() and (expected_ids is None or custom_id in expected_ids)
+    }
+
+class LabelPacker:
+    def __init__(self, language_code, prompt=PACKING_PROMPT, max_tokens=PACKING_MAX_TOKENS_INT, max_label_tokens=PACKING_MAX_LABEL_TOKENS_INT, model=MODEL_NAME, id_prefix=PACKED_ID_PREFIX):
+        self.language_code = language_code
+        self.prompt = prompt
+        self.model = model
+        self.id_prefix = id_prefix
+        self.max_tokens = max_tokens
+        self.max_label_tokens = max_label_tokens
+        self.labels = {}
+        self.tokens = 0
+        self.pack_count = 0
+        self.packed_labels = 0
+
+    def accepts(self, label):
+        return estimate_tokens(label) <= self.max_label_tokens
+
+    def add(self, custom_id, label):
+        tokens = estimate_tokens(label)
+        request = None
+        if self.labels and self.tokens + tokens > self.max_tokens:
+            request = self.flush()
+        self.labels[custom_id] = label
+        self.tokens += tokens
+        self.packed_labels += 1
+        return request
+
+    def flush(self):
+        if not self.labels:
+            return None
+        self.pack_count += 1
+        request = create_packed_request(self.labels, tag_custom_id(f"{self.id_prefix}{self.pack_count}", self.language_code), self.prompt, self.model)
+        self.labels = {}
+        self.tokens = 0
+        return request
@@ -0,0 +1,161 @@
+import json
+import os
+from array import array
+from .properties import *
+from .label_types import LabelTypeClassifier
+
+logger = get_logger(__file__)
+
+COMMENT = 0
+ENTRY = 1
+OTHER = 2
+NO_METADATA_TYPE = -1
+NO_FLOW_VERSION = -1
+INDEX_VERSION = 1
+FLOW_PREFIX = "flow"
+
+class StfRecord:
+    __slots__ = ("line", "kind", "label_offset", "metadata_type", "flow_version")
+
+    def __init__(self, line, kind, label_offset, metadata_type, flow_version):
+        self.line = line
+        self.kind = kind
+        self.label_offset = label_offset
+        self.metadata_type = metadata_type
+        self.flow_version = flow_version
+
+    @property
+    def key(self):
+        return self.line[:self.label_offset - 1]
+
+    @property
+    def label(self):
+        return self.line[self.label_offset:]
+
+def is_flow_key(key):
+    return key[:len(FLOW_PREFIX)].lower() == FLOW_PREFIX
+
+def get_flow_name(key):
+    return ".".join(key.split(".", 3)[0:3])
+
+def get_flow_version(key):
+    if key[:len(FLOW_PREFIX)].lower() != FLOW_PREFIX:
+        return NO_FLOW_VERSION
+    key_parts = key.split(".", 4)
+    return int(key_parts[3]) if len(key_parts) > 3 and key_parts[3].isdigit() else NO_FLOW_VERSION
+
+def split_line(line):
+    if line.startswith("#"):
+        return COMMENT, "", NO_FLOW_VERSION
+    key, separator, _ = line.partition("\t")
+    if not separator:
+        return OTHER, "", NO_FLOW_VERSION
+    return ENTRY, key, get_flow_version(key)
+
+def parse_line(line):
+    kind, key, flow_version = split_line(line)
+    return StfRecord(line, kind, len(key) + 1 if kind == ENTRY else 0, None, flow_version)
+
+def get_index_path(source_file_path):
+    source_file_path = os.path.abspath(source_file_path)
+    directory_name = os.path.basename(os.path.dirname(source_file_path))
+    return os.path.join(STF_INDEX_ROOT, f"{directory_name}_{os.path.basename(source_file_path)}.idx")
+
+def get_signature(source_file_path):
+    source_stat = os.stat(source_file_path)
+    return {
+        "version": INDEX_VERSION,
+        "source_size": source_stat.st_size,
+        "source_mtime_ns": source_stat.st_mtime_ns,
+        "metadata_types_mtime_ns": os.stat(METADATA_TYPES_FILE_PATH).st_mtime_ns
+    }
+
+# Índice del archivo .stf con una entrada por línea guardada en arrays: tipo de línea, posición del
+# label dentro de la línea, tipo de metadato y versión del flujo. Se construye en una sola pasada y se
+# guarda en disco para que las fases siguientes no tengan que volver a clasificar cada key.
+class StfIndex:
+    def __init__(self, metadata_types=None):
+        self.kinds = array("b")
+        self.label_offsets = array("I")
+        self.metadata_types = array("h")
+        self.flow_versions = array("i")
+        self.metadata_type_names = []
+        self.metadata_type_ids = {}
+        self.label_type_classifier = LabelTypeClassifier(metadata_types) if metadata_types is not None else None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, line):
+        kind, key, flow_version = split_line(line)
+        self.kinds.append(kind)
+        self.label_offsets.append(len(key) + 1 if kind == ENTRY else 0)
+        self.metadata_types.append(self.get_metadata_type_id(self.label_type_classifier.classify(key)) if kind == ENTRY else NO_METADATA_TYPE)
+        self.flow_versions.append(flow_version)
+
+    def get_metadata_type_id(self, metadata_type):
+        metadata_type_id = self.metadata_type_ids.get(metadata_type)
+        if metadata_type_id is None:
+            metadata_type_id = self.metadata_type_ids[metadata_type] = len(self.metadata_type_names)
+            self.metadata_type_names.append(metadata_type)
+        return metadata_type_id
+
+    def get_record(self, position, line):
+        metadata_type = self.metadata_types[position]
+        return StfRecord(line, self.kinds[position], self.label_offsets[position], self.metadata_type_names[metadata_type] if metadata_type != NO_METADATA_TYPE else None, self.flow_versions[position])
+
+    def save(self, index_path, signature):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        header = dict(signature, lines=len(self), metadata_type_names=self.metadata_type_names)
+        temporary_index_path = index_path + ".tmp"
+        with open(temporary_index_path, "wb") as file:
+            file.write(json.dumps(header, ensure_ascii=False).encode(ENCODING) + b"\n")
+            for values in (self.kinds, self.label_offsets, self.metadata_types, self.flow_versions):
+                values.tofile(file)
+        os.replace(temporary_index_path, index_path)
+
+    @classmethod
+    def load(cls, index_path, signature):
+        if not os.path.exists(index_path):
+            return None
+        index = cls()
+        with open(index_path, "rb") as file:
+            header = json.loads(file.readline())
+            if any(header.get(name) != value for name, value in signature.items()):
+                return None
+            for values in (index.kinds, index.label_offsets, index.metadata_types, index.flow_versions):
+                values.fromfile(file, header["lines"])
+        index.metadata_type_names = header["metadata_type_names"]
+        return index
+
+def load_metadata_types():
+    with open(METADATA_TYPES_FILE_PATH, "r", encoding=ENCODING) as file:
+        return json.load(file)
+
+def build_index(source_file_path, lines=None):
+    index = StfIndex(load_metadata_types())
+    if lines is None:
+        with open(source_file_path, "r", encoding=ENCODING) as file:
+            for line in file:
+                index.add(line)
+    else:
+        for line in lines:
+            index.add(line)
+    index.save(get_index_path(source_file_path), get_signature(source_file_path))
+    logger.info(f"Índice del archivo {source_file_path} guardado en {get_index_path(source_file_path)} ({len(index)} líneas, {len(index.metadata_type_names)} tipos de metadatos)")
+    logger.info(f"Clasificación de tipos de metadatos: {index.label_type_classifier.hits} aciertos de caché, {index.label_type_classifier.misses} evaluaciones completas")
+    return index
+
+def load_index(source_file_path):
+    index = StfIndex.load(get_index_path(source_file_path), get_signature(source_file_path))
+    if index is None:
+        logger.info(f"No existe un índice actualizado del archivo {source_file_path}. Analizando el archivo")
+        return build_index(source_file_path)
+    logger.info(f"Índice del archivo {source_file_path} reutilizado ({len(index)} líneas)")
+    return index
+
+def read_document(source_file_path):
+    index = load_index(source_file_path)
+    with open(source_file_path, "r", encoding=ENCODING) as file:
+        for position, line in enumerate(file):
+            yield index.get_record(position, line)
@@ -0,0 +1,54 @@
+import hashlib
+import sqlite3
+import time
+from .properties import *
+
+logger = get_logger(__file__)
+
+class TranslationMemory:
+    def __init__(self, file_path=TRANSLATION_MEMORY_FILE_PATH, max_entries=TRANSLATION_MEMORY_MAX_ENTRIES_INT):
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS translations (hash TEXT PRIMARY KEY, translation TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        logger.info(f"Memoria de traducciones abierta: {file_path}")
+
+    @staticmethod
+    def get_hash(label, source_language=SOURCE_LANGUAGE, target_language=TRANSLATION_LANGUAGE, model=MODEL_NAME, prompt=PROMPT):
+        return hashlib.sha256("\x1f".join([label, source_language, target_language, model, prompt]).encode(ENCODING)).hexdigest()
+
+    def get(self, label, target_language=TRANSLATION_LANGUAGE, prompt=PROMPT, model=MODEL_NAME):
+        label_hash = self.get_hash(label, target_language=target_language, model=model, prompt=prompt)
+        row = self.connection.execute("SELECT translation FROM translations WHERE hash = ?", (label_hash,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE translations SET last_used = ? WHERE hash = ?", (time.time(), label_hash))
+        return row[0]
+
+    def put(self, label, translation, target_language=TRANSLATION_LANGUAGE, prompt=PROMPT, model=MODEL_NAME):
+        label_hash = self.get_hash(label, target_language=target_language, model=model, prompt=prompt)
+        self.connection.execute("INSERT OR REPLACE INTO translations (hash, translation, last_used) VALUES (?, ?, ?)", (label_hash, translation, time.time()))
+        self.stored += 1
+
+    def evict(self):
+        entries = self.connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if entries <= self.max_entries:
+            return
+        self.connection.execute("DELETE FROM translations WHERE hash IN (SELECT hash FROM translations ORDER BY last_used LIMIT ?)", (entries - self.max_entries,))
+        logger.info(f"Eliminadas {entries - self.max_entries} entradas antiguas de la memoria de traducciones")
+
+    def close(self):
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
+        lookups = self.hits + self.misses
+        if lookups:
+            logger.info(f"Memoria de traducciones: {self.hits}/{lookups} aciertos ({self.hits / lookups:.1%}), {self.misses} fallos")
+        if self.stored:
+            logger.info(f"Memoria de traducciones: {self.stored} traducciones nuevas guardadas en {self.file_path}")
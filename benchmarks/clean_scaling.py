@@ -0,0 +1,50 @@
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+
+BENCHMARKS_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_ROOT)
+from corpus import generate_stf
+from run import run_stage_process
+
+def measure_clean(lines, seed):
+    work_dir = tempfile.mkdtemp(prefix="traductor_clean_scaling_")
+    try:
+        input_root = os.path.join(work_dir, "input")
+        os.makedirs(input_root)
+        corpus_lines = generate_stf(os.path.join(input_root, "Source.stf"), lines, seed)
+        metrics = run_stage_process("clean_file", work_dir)
+        if not metrics["result"]:
+            raise RuntimeError(f"La limpieza de {corpus_lines} líneas ha fallado")
+        return corpus_lines, metrics["wall_time"]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comprueba que el tiempo de limpieza crece de forma lineal con el número de líneas del archivo .stf.")
+    parser.add_argument("-l", "--lines", type=int, nargs="+", default=[25000, 100000, 400000], help="Tamaños del archivo de entrada en líneas")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Semilla del generador de archivos")
+    parser.add_argument("--max-exponent", type=float, default=1.2, help="Exponente máximo permitido entre el tamaño menor y el mayor (1 es lineal)")
+    arguments = parser.parse_args(argv)
+
+    results = [measure_clean(lines, arguments.seed) for lines in sorted(arguments.lines)]
+    smallest_lines, smallest_time = results[0]
+    print("Escalado de la limpieza:")
+    for corpus_lines, wall_time in results:
+        print(f"  {corpus_lines:9} líneas {wall_time:8.2f} s {wall_time / corpus_lines * 1e6:8.2f} µs/línea ({wall_time / corpus_lines / (smallest_time / smallest_lines):.2f}x)")
+
+    largest_lines, largest_time = results[-1]
+    if largest_lines == smallest_lines:
+        return 0
+    exponent = math.log(largest_time / smallest_time) / math.log(largest_lines / smallest_lines)
+    print(f"  Exponente de crecimiento: {exponent:.2f} (máximo {arguments.max_exponent})")
+    if exponent > arguments.max_exponent:
+        print("La limpieza crece más rápido que de forma lineal")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Traductor")
+METADATA_TYPES_FILE_PATH = os.path.join(PACKAGE_ROOT, "resources", "static", "metadata_types.json")
+
+STF_HEADER = [
+    "# Use the Translation Workbench to export and import translations.\n",
+    "# Edit only the LABEL column. Lines starting with # are ignored.\n",
+    "Language code: es\n",
+    "Type: Source\n",
+    "Translation type: Metadata\n",
+    "\n",
+    "------------------OUTDATED AND UNTRANSLATED-----------------\n",
+    "\n",
+    "# KEY\tLABEL\n",
+]
+
+WORDS = (
+    "account contact opportunity case lead quote order invoice product price amount date status stage owner "
+    "region country city street postal code phone email website industry revenue employees rating priority "
+    "origin reason type source description comment approval manager team territory campaign contract asset "
+    "service appointment schedule payment discount total tax shipping billing record related primary active "
+    "closed open pending review required optional customer partner support renewal forecast target quarter"
+).split()
+COMMON_LABELS = ["Name", "Description", "Status", "Type", "Owner", "Created Date", "Amount", "Active", "Email", "Phone", "Next", "Previous", "Finish", "Cancel", "Save"]
+HTML_WRAPPERS = (
+    "<b>{}</b>",
+    "<p>{}</p><br/>",
+    "<p style=\"margin: 0; font-family: Arial, sans-serif; font-size: 12px;\">{}</p>",
+    "<a href=\"https://www.example.com/support/knowledge\" target=\"_blank\">{}</a>",
+)
+NON_TRANSLATABLE_LABELS = ("2024", "10,5 %", "{!Account.Name}", "<br/>", "Account_Region__c", "Opportunity.StageName", "https://www.example.com/terms", "support@example.com")
+LONG_LABEL_SUFFIXES = ("Description", "HelpText", "ErrorMessage", "Subject", "PausedText")
+FLOW_ELEMENTS = ("Name", "FieldLabel", "HelpText", "ErrorMessage", "NextOrFinishButtonLabel", "BackButtonLabel", "PausedText", "Description")
+
+TRANSLATION_LANGUAGE_PATTERN = re.compile(r"translate it into (.+?)\. ")
+
+def load_metadata_types():
+    with open(METADATA_TYPES_FILE_PATH, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def get_key_parts(pattern):
+    literals = re.findall(r"\w+", pattern)
+    return literals[0], literals[1] if len(literals) > 1 else None
+
+def create_label(rng, long_label):
+    if rng.random() < 0.02:
+        return rng.choice(NON_TRANSLATABLE_LABELS)
+    if not long_label and rng.random() < 0.3:
+        return rng.choice(COMMON_LABELS)
+
+    word_count = rng.randint(6, 40) if long_label else rng.randint(1, 4)
+    label = " ".join(rng.choice(WORDS) for _ in range(word_count)).capitalize()
+    if long_label and rng.random() < 0.05:
+        label = label.replace(" ", "\\n", 1) + "\\n" + label[:40]
+    if rng.random() < 0.05:
+        label = rng.choice(HTML_WRAPPERS).format(label)
+    if rng.random() < 0.05:
+        label = f"{label} {{!Account.Name}}"
+    return label
+
+def create_metadata_lines(rng, metadata_types, index):
+    metadata_type = rng.choice(metadata_types)
+    first, last = get_key_parts(metadata_type[1])
+    middle = f"{rng.choice(WORDS).capitalize()}_{index}__c"
+    key = f"{first}.{middle}.{last}" if last else f"{first}.{middle}"
+    return [f"{key}\t{create_label(rng, (last or '').endswith(LONG_LABEL_SUFFIXES))}\n"]
+
+def create_flow_lines(rng, index):
+    flow_name = f"{rng.choice(WORDS).capitalize()}_Flow_{index}"
+    versions = rng.randint(1, 15)
+    elements = [(f"Screen_{element}", rng.choice(FLOW_ELEMENTS)) for element in range(rng.randint(1, 8))]
+    lines = []
+    for version in range(1, versions + 1):
+        for element, element_type in elements:
+            lines.append(f"Flow.Flow.{flow_name}.{version}.{element}.{element_type}\t{create_label(rng, element_type in LONG_LABEL_SUFFIXES)}\n")
+    if rng.random() < 0.1:
+        lines.append(f"Flow.AutoLaunchedFlow.{flow_name}.1.TextTemplate.Body\t{create_label(rng, True)}\n")
+    return lines
+
+def generate_stf(file_path, lines, seed=0):
+    rng = random.Random(seed)
+    metadata_types = [item for item in load_metadata_types().items() if not item[0].startswith("Flow.")]
+    written_lines = 0
+    index = 0
+    previous_lines = []
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.writelines(STF_HEADER)
+        written_lines += len(STF_HEADER)
+        while written_lines < lines:
+            index += 1
+            value = rng.random()
+            if value < 0.005 and previous_lines:
+                new_lines = [rng.choice(previous_lines)]
+            elif value < 0.1:
+                new_lines = create_flow_lines(rng, index)
+            else:
+                new_lines = create_metadata_lines(rng, metadata_types, index)
+            new_lines = new_lines[:lines - written_lines]
+            file.writelines(new_lines)
+            written_lines += len(new_lines)
+            if len(previous_lines) < 1000:
+                previous_lines.extend(new_lines[:1])
+    return written_lines
+
+def fake_translate(text, language):
+    return f"[{language}] {text}"
+
+def create_fake_response(request):
+    body = request["body"]
+    match = TRANSLATION_LANGUAGE_PATTERN.search(body["messages"][0]["content"])
+    language = match.group(1) if match else "Spanish (Spain)"
+    content = body["messages"][-1]["content"]
+    if body.get("response_format", {}).get("type") == "json_object":
+        content = json.dumps({custom_id: fake_translate(label, language) for custom_id, label in json.loads(content).items()}, ensure_ascii=False)
+    else:
+        content = fake_translate(content, language)
+    finish_reason = "stop"
+    if len(content) // 4 + 1 > body.get("max_tokens", len(content)):
+        content = content[:body["max_tokens"] * 4]
+        finish_reason = "length"
+    return {
+        "id": f"batch_req_{request['custom_id']}",
+        "custom_id": request["custom_id"],
+        "response": {
+            "status_code": 200,
+            "request_id": f"req_{request['custom_id']}",
+            "body": {
+                "object": "chat.completion",
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+        },
+        "error": None
+    }
+
+def write_fake_batch_output(input_file_paths, output_root):
+    os.makedirs(output_root, exist_ok=True)
+    output_file_paths = []
+    for input_file_path in input_file_paths:
+        output_file_path = os.path.join(output_root, os.path.basename(input_file_path))
+        with open(input_file_path, "r", encoding="utf-8") as infile, open(output_file_path, "w", encoding="utf-8") as outfile:
+            for line in infile:
+                if line.strip():
+                    outfile.write(json.dumps(create_fake_response(json.loads(line)), ensure_ascii=False) + "\n")
+        output_file_paths.append(output_file_path)
+    return output_file_paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un archivo .stf sintético con todos los tipos de metadatos, flujos con varias versiones, keys duplicadas y cabecera comentada.")
+    parser.add_argument("output", help="Ruta del archivo .stf a generar")
+    parser.add_argument("-l", "--lines", type=int, default=10000, help="Número de líneas (por ejemplo de 10000 a 5000000)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Semilla para obtener siempre el mismo archivo")
+    arguments = parser.parse_args(argv)
+
+    written_lines = generate_stf(arguments.output, arguments.lines, arguments.seed)
+    print(f"Generadas {written_lines} líneas en {arguments.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
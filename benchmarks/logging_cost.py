@@ -0,0 +1,76 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Traductor")
+sys.path.insert(0, PACKAGE_ROOT)
+
+from modules import properties
+
+LINE = "CustomField.Account.Industry__c.FieldLabel\tIndustry segment"
+
+def run_previous_logging(lines, log_dir, handlers, level):
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    file_handlers = []
+    for index in range(handlers):
+        file_handler = logging.FileHandler(os.path.join(log_dir, f"previous_{level}_{index}.log"), encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(message)s"))
+        root_logger.addHandler(file_handler)
+        file_handlers.append(file_handler)
+
+    logger = logging.getLogger("generate_batch_input")
+    start_time = time.perf_counter()
+    for index in range(lines):
+        logger.debug(f"{index} - Procesando línea: {LINE}")
+    elapsed_time = time.perf_counter() - start_time
+
+    for file_handler in file_handlers:
+        root_logger.removeHandler(file_handler)
+        file_handler.close()
+    return elapsed_time
+
+def run_current_logging(lines, level):
+    properties.LOG_LEVEL = level
+    properties.LOG_STAGE_LEVELS = {}
+    properties.init_logging("logging_cost")
+    logger = logging.getLogger("generate_batch_input")
+    trace = properties.TraceSampler(logger)
+
+    start_time = time.perf_counter()
+    for index in range(lines):
+        trace.trace("líneas procesadas", "%s - Procesando línea: %s", index, LINE)
+    trace.summary("Resumen")
+    elapsed_time = time.perf_counter() - start_time
+
+    properties.stop_logging()
+    return elapsed_time
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el coste del logging por línea (antes: f-string y FileHandler síncrono por módulo; después: cola, formateo diferido y trazas muestreadas).")
+    parser.add_argument("-l", "--lines", type=int, default=1000000, help="Número de líneas simuladas")
+    parser.add_argument("--handlers", type=int, default=5, help="FileHandlers que añadía get_logger en una ejecución completa (uno por módulo)")
+    arguments = parser.parse_args(argv)
+
+    properties.set_main_directory(os.path.join(PACKAGE_ROOT, "__main__.py"))
+    with tempfile.TemporaryDirectory() as work_dir:
+        properties.set_working_directory(work_dir)
+        log_dir = os.path.join(work_dir, properties.LOG_ROOT)
+        results = [
+            ("Antes, DEBUG", run_previous_logging(arguments.lines, log_dir, arguments.handlers, "DEBUG")),
+            ("Antes, INFO", run_previous_logging(arguments.lines, log_dir, arguments.handlers, "INFO")),
+            ("Después, DEBUG muestreado", run_current_logging(arguments.lines, "DEBUG")),
+            ("Después, INFO", run_current_logging(arguments.lines, "INFO")),
+        ]
+        os.chdir(PACKAGE_ROOT)
+
+    scale = 1000000 / arguments.lines
+    print(f"Coste del logging por línea ({arguments.lines} líneas, muestreo cada {properties.LOG_TRACE_SAMPLE_EVERY_INT}):")
+    for name, elapsed_time in results:
+        print(f"  {name:28} {elapsed_time * scale:8.2f} s por millón de líneas ({elapsed_time / arguments.lines * 1e9:8.0f} ns/línea)")
+
+if __name__ == "__main__":
+    main()
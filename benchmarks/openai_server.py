@@ -0,0 +1,239 @@
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from corpus import create_fake_response
+
+FINAL_STATUSES = ["completed", "failed", "expired", "cancelled"]
+
+class FakeBatchService:
+    def __init__(self, latency=5.0, failure_rate=0.0, expiry_rate=0.0, expired_fraction=0.5, error_rate=0.0, seed=0, completion_latency=0.0, rate_limit_rate=0.0):
+        self.latency = latency
+        self.completion_latency = completion_latency
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.expiry_rate = expiry_rate
+        self.expired_fraction = expired_fraction
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.counter = itertools.count(1)
+        self.lock = threading.RLock()
+        self.files = {}
+        self.batches = {}
+        self.failed_requests = set()
+
+    def create_file(self, filename, purpose, content):
+        with self.lock:
+            file_id = f"file-{next(self.counter)}"
+            self.files[file_id] = {"filename": filename, "purpose": purpose, "content": content, "created_at": int(time.time())}
+        return self.get_file_object(file_id)
+
+    def get_file_object(self, file_id):
+        file = self.files[file_id]
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(file["content"]),
+            "created_at": file["created_at"],
+            "filename": file["filename"],
+            "purpose": file["purpose"],
+            "status": "processed"
+        }
+
+    def create_batch(self, input_file_id, endpoint, completion_window, metadata=None):
+        if input_file_id not in self.files:
+            return None
+        with self.lock:
+            batch_id = f"batch_{next(self.counter)}"
+            value = self.rng.random()
+            if value < self.failure_rate:
+                final_status = "failed"
+            elif value < self.failure_rate + self.expiry_rate:
+                final_status = "expired"
+            else:
+                final_status = "completed"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": endpoint,
+                "errors": None,
+                "input_file_id": input_file_id,
+                "completion_window": completion_window,
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": metadata,
+                "final_status": final_status,
+                "created": time.monotonic()
+            }
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] not in FINAL_STATUSES:
+                elapsed_time = time.monotonic() - batch["created"]
+                if elapsed_time >= self.latency:
+                    self.finish_batch(batch, batch["final_status"], 1.0 if batch["final_status"] == "completed" else self.expired_fraction)
+                elif elapsed_time >= self.latency * 0.1:
+                    batch["status"] = "in_progress"
+            return {name: value for name, value in batch.items() if name not in ("final_status", "created")}
+
+    def cancel_batch(self, batch_id):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] not in FINAL_STATUSES:
+                self.finish_batch(batch, "cancelled", min(1.0, (time.monotonic() - batch["created"]) / self.latency) if self.latency else 1.0)
+        return self.get_batch(batch_id)
+
+    def finish_batch(self, batch, status, processed_fraction):
+        batch["status"] = status
+        batch[f"{status}_at"] = int(time.time())
+        if status == "failed":
+            batch["errors"] = {"object": "list", "data": [{"code": "server_error", "message": "Fallo simulado del batch"}]}
+            return
+
+        requests = [json.loads(line) for line in self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines() if line.strip()]
+        processed_requests = requests[:int(len(requests) * processed_fraction)]
+        output_lines = []
+        error_lines = []
+        for request in processed_requests:
+            custom_id = request["custom_id"]
+            if custom_id not in self.failed_requests and random.Random(f"{self.seed}:{custom_id}").random() < self.error_rate:
+                self.failed_requests.add(custom_id)
+                error_lines.append(json.dumps({"id": f"batch_req_{custom_id}", "custom_id": custom_id, "response": {"status_code": 500, "request_id": f"req_{custom_id}", "body": {"error": {"message": "Error simulado", "type": "server_error"}}}, "error": None}))
+            else:
+                output_lines.append(json.dumps(create_fake_response(request), ensure_ascii=False))
+
+        batch["request_counts"] = {"total": len(requests), "completed": len(output_lines), "failed": len(error_lines)}
+        if output_lines:
+            batch["output_file_id"] = self.create_file("batch_output.jsonl", "batch_output", ("\n".join(output_lines) + "\n").encode("utf-8"))["id"]
+        if error_lines:
+            batch["error_file_id"] = self.create_file("batch_errors.jsonl", "batch_output", ("\n".join(error_lines) + "\n").encode("utf-8"))["id"]
+
+    def create_completion(self, body):
+        time.sleep(self.completion_latency)
+        with self.lock:
+            value = self.rng.random()
+            completion_id = f"chatcmpl-{next(self.counter)}"
+        if value < self.rate_limit_rate:
+            return 429, {"error": {"message": "Límite de solicitudes simulado", "type": "rate_limit_error"}}
+        if value < self.rate_limit_rate + self.error_rate:
+            return 500, {"error": {"message": "Error simulado", "type": "server_error"}}
+        completion = create_fake_response({"custom_id": completion_id, "body": body})["response"]["body"]
+        completion.update({"id": completion_id, "created": int(time.time())})
+        return 200, completion
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_not_found(self):
+        self.send_json(404, {"error": {"message": f"No encontrado: {self.path}", "type": "invalid_request_error"}})
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def get_path_parts(self):
+        path = self.path.split("?", 1)[0].strip("/").split("/")
+        return path[1:] if path and path[0] == "v1" else path
+
+    def do_GET(self):
+        parts = self.get_path_parts()
+        if len(parts) == 2 and parts[0] == "batches":
+            batch = self.service.get_batch(parts[1])
+            return self.send_json(200, batch) if batch else self.send_not_found()
+        if len(parts) == 3 and parts[0] == "files" and parts[2] == "content" and parts[1] in self.service.files:
+            content = self.service.files[parts[1]]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        if len(parts) == 2 and parts[0] == "files" and parts[1] in self.service.files:
+            return self.send_json(200, self.service.get_file_object(parts[1]))
+        self.send_not_found()
+
+    def do_POST(self):
+        parts = self.get_path_parts()
+        body = self.read_body()
+        if parts == ["files"]:
+            message = email.parser.BytesParser(policy=email.policy.default).parsebytes(b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + body)
+            fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+            file = fields["file"]
+            return self.send_json(200, self.service.create_file(file.get_filename(), fields["purpose"].get_content().strip(), file.get_content() if isinstance(file.get_content(), bytes) else file.get_content().encode("utf-8")))
+        if parts == ["batches"]:
+            request = json.loads(body or b"{}")
+            batch = self.service.create_batch(request.get("input_file_id"), request.get("endpoint"), request.get("completion_window"), request.get("metadata"))
+            return self.send_json(200, batch) if batch else self.send_json(400, {"error": {"message": "input_file_id no válido", "type": "invalid_request_error"}})
+        if parts == ["chat", "completions"]:
+            status, completion = self.service.create_completion(json.loads(body or b"{}"))
+            return self.send_json(status, completion, {"retry-after": "1"} if status == 429 else None)
+        if len(parts) == 3 and parts[0] == "batches" and parts[2] == "cancel":
+            batch = self.service.cancel_batch(parts[1])
+            return self.send_json(200, batch) if batch else self.send_not_found()
+        self.send_not_found()
+
+def create_server(host="127.0.0.1", port=8000, **service_options):
+    handler = type("Handler", (FakeOpenAIHandler,), {"service": FakeBatchService(**service_options)})
+    return ThreadingHTTPServer((host, port), handler)
+
+def start_server(host="127.0.0.1", port=0, **service_options):
+    server = create_server(host, port, **service_options)
+    threading.Thread(target=server.serve_forever, name="FakeOpenAIServer", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita los endpoints de files, batches y chat completions de la API de OpenAI con traducciones simuladas deterministas.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección en la que escuchar")
+    parser.add_argument("-p", "--port", type=int, default=8000, help="Puerto en el que escuchar")
+    parser.add_argument("--latency", type=float, default=5.0, help="Segundos hasta que un batch termina")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Proporción de batches que terminan en estado failed")
+    parser.add_argument("--expiry-rate", type=float, default=0.0, help="Proporción de batches que terminan en estado expired")
+    parser.add_argument("--expired-fraction", type=float, default=0.5, help="Proporción de solicitudes con resultado en los batches expirados")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proporción de solicitudes que fallan en su primer intento")
+    parser.add_argument("--completion-latency", type=float, default=0.0, help="Segundos que tarda cada solicitud de chat completions")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Proporción de solicitudes de chat completions que responden 429")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Semilla para los fallos simulados")
+    arguments = parser.parse_args(argv)
+
+    server = create_server(arguments.host, arguments.port, latency=arguments.latency, failure_rate=arguments.failure_rate, expiry_rate=arguments.expiry_rate,
+                           expired_fraction=arguments.expired_fraction, error_rate=arguments.error_rate, seed=arguments.seed,
+                           completion_latency=arguments.completion_latency, rate_limit_rate=arguments.rate_limit_rate)
+    print(f"Servidor de batches simulado en http://{arguments.host}:{server.server_address[1]}/v1 (configurar OPENAI_BASE_URL con esta dirección)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
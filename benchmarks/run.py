@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARKS_ROOT = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_ROOT = os.path.join(os.path.dirname(BENCHMARKS_ROOT), "Traductor")
+RESULTS_FILE_PATH = os.path.join(BENCHMARKS_ROOT, "results.jsonl")
+STAGES = ["clean_file", "generate_batch_input", "export_batch", "process_batch_output"]
+
+sys.path.insert(0, BENCHMARKS_ROOT)
+from corpus import generate_stf, write_fake_batch_output
+from openai_server import start_server
+
+def get_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+def run_stage(stage, work_dir):
+    sys.path.insert(0, PACKAGE_ROOT)
+    from modules import properties
+    properties.set_main_directory(os.path.join(PACKAGE_ROOT, "__main__.py"))
+    properties.set_working_directory(work_dir)
+    properties.init_logging(f"benchmark_{stage}")
+
+    start_time = time.perf_counter()
+    if stage == "clean_file":
+        from modules.clean_file import clean_file
+        result = clean_file(properties.SOURCE_FILE_PATH, interactive=False)
+    elif stage == "generate_batch_input":
+        from modules.generate_batch_input import generate_batch_input
+        result = generate_batch_input()
+    elif stage == "export_batch":
+        from modules.cli import ConsoleProgress
+        from modules.export_batch import export_batch
+        result = export_batch(properties.get_file_parts(properties.BATCH_DATA_ROOT), ConsoleProgress())
+    else:
+        from modules.process_batch_output import process_batch_output
+        result = process_batch_output()
+    wall_time = time.perf_counter() - start_time
+
+    properties.stop_logging()
+    return {"result": bool(result), "wall_time": wall_time, "peak_rss": get_peak_rss()}
+
+def run_stage_process(stage, work_dir, environment=None):
+    process = subprocess.run([sys.executable, __file__, "--stage", stage, "--work-dir", work_dir], capture_output=True, text=True, env=environment)
+    if process.returncode != 0:
+        raise RuntimeError(f"La fase {stage} ha fallado:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmark(lines, seed, keep_dir=None, base_url=None):
+    work_dir = keep_dir or tempfile.mkdtemp(prefix="traductor_benchmark_")
+    if keep_dir:
+        shutil.rmtree(keep_dir, ignore_errors=True)
+        os.makedirs(keep_dir)
+    try:
+        from_path = os.path.join(work_dir, "corpus.stf")
+        corpus_lines = generate_stf(from_path, lines, seed)
+        input_root = os.path.join(work_dir, "input")
+        os.makedirs(input_root, exist_ok=True)
+        shutil.move(from_path, os.path.join(input_root, "Source.stf"))
+
+        stages = {}
+        environment = dict(os.environ, TRADUCTOR_OPENAI_BASE_URL=base_url or "", TRADUCTOR_API_KEY="local", TRADUCTOR_BATCH_POLL_MIN_WAIT="1")
+        for stage in STAGES:
+            if stage == "export_batch" and not base_url:
+                batch_data_root = os.path.join(work_dir, "resources", "batch_data")
+                input_file_paths = sorted(os.path.join(batch_data_root, file) for file in os.listdir(batch_data_root) if file.endswith(".jsonl"))
+                write_fake_batch_output(input_file_paths, os.path.join(work_dir, "resources", "batch_output"))
+                continue
+            metrics = run_stage_process(stage, work_dir, environment)
+            metrics["lines_per_second"] = corpus_lines / metrics["wall_time"] if metrics["wall_time"] else None
+            stages[stage] = metrics
+        return corpus_lines, stages
+    finally:
+        if not keep_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def load_previous_result(results_file_path, lines, seed):
+    if not os.path.exists(results_file_path):
+        return None
+    previous_result = None
+    with open(results_file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                if result["lines"] == lines and result["seed"] == seed:
+                    previous_result = result
+    return previous_result
+
+def format_change(value, previous_value):
+    if not previous_value:
+        return ""
+    return f" ({(value - previous_value) / previous_value:+.1%})"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el tiempo, las líneas por segundo y el pico de memoria de cada fase sobre archivos .stf sintéticos y guarda los resultados para compararlos.")
+    parser.add_argument("-l", "--lines", type=int, nargs="+", default=[10000, 100000], help="Tamaños del archivo de entrada en líneas (hasta 5000000)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Semilla del generador de archivos")
+    parser.add_argument("-r", "--results", default=RESULTS_FILE_PATH, help="Archivo JSONL donde se acumulan los resultados")
+    parser.add_argument("--keep", help="Directorio donde conservar los archivos de trabajo de la última ejecución")
+    parser.add_argument("--export", action="store_true", help="Ejecuta también la exportación contra el servidor de batches simulado en lugar de generar directamente las respuestas")
+    parser.add_argument("--latency", type=float, default=1.0, help="Segundos que tarda cada batch en el servidor simulado")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.stage:
+        print(json.dumps(run_stage(arguments.stage, arguments.work_dir)))
+        return 0
+
+    base_url = None
+    if arguments.export:
+        server, base_url = start_server(latency=arguments.latency, seed=arguments.seed)
+
+    for lines in arguments.lines:
+        corpus_lines, stages = run_benchmark(lines, arguments.seed, arguments.keep, base_url)
+        result = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "lines": lines,
+            "seed": arguments.seed,
+            "stages": stages,
+        }
+        previous_result = load_previous_result(arguments.results, lines, arguments.seed)
+
+        print(f"{corpus_lines} líneas:")
+        for stage, metrics in stages.items():
+            previous_metrics = previous_result["stages"].get(stage, {}) if previous_result else {}
+            print(f"  {stage:22} {metrics['wall_time']:8.2f} s{format_change(metrics['wall_time'], previous_metrics.get('wall_time'))}"
+                  f"  {metrics['lines_per_second']:12.0f} líneas/s  {metrics['peak_rss'] / 1024 / 1024:8.1f} MiB{format_change(metrics['peak_rss'], previous_metrics.get('peak_rss'))}")
+        if previous_result:
+            print(f"  (comparado con {previous_result['date']}, commit {previous_result['commit']})")
+
+        with open(arguments.results, "a", encoding="utf-8") as file:
+            file.write(json.dumps(result) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_ROOT = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_ROOT = os.path.join(os.path.dirname(BENCHMARKS_ROOT), "Traductor")
+sys.path.insert(0, BENCHMARKS_ROOT)
+sys.path.insert(0, PACKAGE_ROOT)
+
+from corpus import generate_stf
+from modules import properties
+
+def read_labels(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return [line.rstrip("\n").split("\t", 1)[1] for line in file if "\t" in line and not line.startswith("#")]
+
+def run_json_dumps(labels, create_request):
+    start_time = time.perf_counter()
+    for index, label in enumerate(labels):
+        json.dumps(create_request(label, f"es:request-{index}"), ensure_ascii=False) + "\n"
+    return time.perf_counter() - start_time
+
+def run_serializer(labels, serializer):
+    start_time = time.perf_counter()
+    for index, label in enumerate(labels):
+        serializer.serialize(label, f"es:request-{index}")
+    return time.perf_counter() - start_time
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el rendimiento de la serialización de solicitudes (antes: json.dumps por solicitud; después: RequestSerializer con plantilla precalculada).")
+    parser.add_argument("-l", "--lines", type=int, default=200000, help="Número de líneas del corpus sintético")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Semilla del corpus")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Repeticiones de cada medida; se muestra la mejor")
+    arguments = parser.parse_args(argv)
+
+    properties.set_main_directory(os.path.join(PACKAGE_ROOT, "__main__.py"))
+    from modules.generate_batch_input import RequestSerializer, create_request
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus_path = os.path.join(work_dir, "corpus.stf")
+        generate_stf(corpus_path, arguments.lines, arguments.seed)
+        labels = read_labels(corpus_path)
+
+    serializer = RequestSerializer()
+    size = sum(len(serializer.serialize(label, f"es:request-{index}")[0].encode("utf-8")) for index, label in enumerate(labels))
+    results = [
+        ("Antes, json.dumps", min(run_json_dumps(labels, create_request) for _ in range(arguments.repeat))),
+        ("Después, RequestSerializer", min(run_serializer(labels, serializer) for _ in range(arguments.repeat))),
+    ]
+
+    print(f"Serialización de {len(labels)} solicitudes (mejor de {arguments.repeat}):")
+    for name, elapsed_time in results:
+        print(f"  {name:28} {elapsed_time:7.3f} s {len(labels) / elapsed_time:12.0f} solicitudes/s {size / elapsed_time / 1e6:8.1f} MB/s")
+    print(f"  Mejora: {results[0][1] / results[1][1]:.1f}x")
+
+if __name__ == "__main__":
+    main()
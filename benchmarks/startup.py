@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Traductor")
+STAGE_MODULES = ["cli", "clean_file", "incremental", "generate_batch_input", "export_batch", "process_batch_output"]
+LAZY_MODULES = ["pandas", "openpyxl", "openai", "psutil", "tkinter"]
+
+STARTUP_CODE = (
+    "from modules.properties import set_main_directory\n"
+    "set_main_directory('__main__.py')\n"
+    f"from modules import {', '.join(STAGE_MODULES)}\n"
+)
+
+def run_startup():
+    start_time = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_CODE], cwd=PACKAGE_ROOT, capture_output=True, text=True)
+    wall_time = time.perf_counter() - start_time
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((name[1:].rstrip(), int(cumulative)))
+    return wall_time, imports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el tiempo de arranque en frío (imports de la CLI y de todas las fases) con -X importtime.")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Número de ejecuciones")
+    parser.add_argument("--budget-ms", type=float, default=250, help="Tiempo máximo de imports (mediana) antes de considerarlo una regresión")
+    arguments = parser.parse_args(argv)
+
+    wall_times = []
+    import_times = []
+    for _ in range(arguments.runs):
+        wall_time, imports = run_startup()
+        wall_times.append(wall_time * 1000)
+        import_times.append(sum(cumulative for name, cumulative in imports if not name.startswith(" ")) / 1000)
+
+    print(f"Arranque en frío: mediana {statistics.median(wall_times):.1f} ms de proceso, {statistics.median(import_times):.1f} ms de imports ({arguments.runs} ejecuciones)")
+    print("Imports de primer nivel más lentos:")
+    for name, cumulative in sorted((item for item in imports if not item[0].startswith(" ")), key=lambda item: -item[1])[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+    imported_names = {name.strip().split(".")[0] for name, _ in imports}
+    loaded_lazy_modules = [name for name in LAZY_MODULES if name in imported_names]
+    if loaded_lazy_modules:
+        print(f"ERROR: dependencias cargadas al arrancar: {', '.join(loaded_lazy_modules)}")
+        return 1
+    if statistics.median(import_times) > arguments.budget_ms:
+        print(f"ERROR: el tiempo de imports supera el presupuesto de {arguments.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+import os
+import sys
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Traductor")
+
+sys.path.insert(0, PACKAGE_ROOT)
+from modules import properties
+properties.set_main_directory(os.path.join(PACKAGE_ROOT, "__main__.py"))
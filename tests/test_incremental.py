@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+import sys
+from conftest import PACKAGE_ROOT
+
+SOURCE_LINES = [
+    "# Language: Spanish\n",
+    "CustomField.Account.Industry__c.FieldLabel\tIndustry segment\n",
+    "CustomLabel.Welcome_Message\tWelcome to the portal\n",
+    "PicklistValue.Account.Rating.Hot\tHot\n",
+]
+TRANSLATED_LINES = [
+    "CustomField.Account.Industry__c.FieldLabel\tSegmento del sector\n",
+    "CustomLabel.Welcome_Message\tBienvenido al portal\n",
+    "PicklistValue.Account.Rating.Hot\tCaliente\n",
+]
+
+def copy_package(destination):
+    os.makedirs(destination)
+    shutil.copy(os.path.join(PACKAGE_ROOT, "__main__.py"), destination)
+    shutil.copytree(os.path.join(PACKAGE_ROOT, "modules"), os.path.join(destination, "modules"), ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copytree(os.path.join(PACKAGE_ROOT, "resources", "static"), os.path.join(destination, "resources", "static"))
+
+def write_lines(file_path, lines):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+
+def test_previous_run_backup_can_be_used_for_incremental(tmp_path):
+    package_root = tmp_path / "Traductor"
+    copy_package(package_root)
+    write_lines(str(tmp_path / "input" / "Source.stf"), SOURCE_LINES)
+    write_lines(str(tmp_path / "output" / "Translated.stf"), TRANSLATED_LINES)
+    environment = dict(os.environ, TRADUCTOR_API_KEY="test", TRADUCTOR_OPENAI_BASE_URL="http://127.0.0.1:9/v1")
+
+    backup_code = (
+        "import sys\n"
+        f"sys.path.insert(0, {str(package_root)!r})\n"
+        "from modules import properties\n"
+        f"properties.set_main_directory({str(package_root / '__main__.py')!r})\n"
+        "properties.init_logging('backup')\n"
+        "print(properties.save_backup())\n"
+    )
+    subprocess.run([sys.executable, "-c", backup_code], cwd=tmp_path, env=environment, check=True, capture_output=True)
+    backup_dirs = list(tmp_path.glob("backup_*"))
+    assert len(backup_dirs) == 1
+    assert (backup_dirs[0] / "input" / "Source.stf").is_file()
+    assert (backup_dirs[0] / "output" / "Translated.stf").is_file()
+
+    write_lines(str(tmp_path / "nuevo.stf"), SOURCE_LINES)
+    result = subprocess.run([sys.executable, str(package_root), str(tmp_path / "nuevo.stf"), "-p", str(backup_dirs[0]), "-o", str(tmp_path / "salida")], cwd=tmp_path, env=environment, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    with open(tmp_path / "salida" / "Translated.stf", "r", encoding="utf-8") as file:
+        assert sorted(line for line in file if not line.startswith("#")) == sorted(TRANSLATED_LINES)
@@ -0,0 +1,96 @@
+import json
+import os
+import random
+import re
+from conftest import PACKAGE_ROOT
+from modules.label_types import LabelTypeClassifier, DEFAULT_LABEL_TYPE
+
+METADATA_TYPES_FILE_PATH = os.path.join(PACKAGE_ROOT, "resources", "static", "metadata_types.json")
+WORDS = ["Account", "Contact", "Opportunity", "Status__c", "Name__c", "Label", "Main", "Step_1", "screen1", "Field", "Value", "X"]
+
+def load_metadata_types():
+    with open(METADATA_TYPES_FILE_PATH, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def reference_classify(metadata_types, key):
+    for metadata_type, pattern in metadata_types.items():
+        if re.search(pattern, key):
+            return metadata_type
+    return DEFAULT_LABEL_TYPE
+
+def get_literals(metadata_types):
+    literals = set()
+    for pattern in metadata_types.values():
+        literals.update(re.findall(r"[A-Za-z]\w*", pattern))
+    return sorted(literals)
+
+def generate_keys(metadata_types, count, seed=0):
+    generator = random.Random(seed)
+    literals = get_literals(metadata_types)
+    keys = []
+    for _ in range(count):
+        components = [generator.choice(literals if generator.random() < 0.5 else WORDS) for _ in range(generator.randint(1, 5))]
+        if generator.random() < 0.1:
+            components[0] = generator.choice(["X", "my"]) + components[0]
+        if generator.random() < 0.1:
+            components[-1] += generator.choice(["X", "s", "__c"])
+        keys.append(".".join(components))
+    return keys
+
+def assert_same_classification(metadata_types, keys):
+    classifier = LabelTypeClassifier(metadata_types)
+    expected_types = [reference_classify(metadata_types, key) for key in keys]
+    for _ in range(2):
+        for key, expected_type in zip(keys, expected_types):
+            assert classifier.classify(key) == expected_type, key
+    return classifier
+
+def test_classify_matches_reference_on_synthetic_keys():
+    metadata_types = load_metadata_types()
+    keys = generate_keys(metadata_types, 50000)
+    classifier = assert_same_classification(metadata_types, keys)
+    assert classifier.use_shape_cache
+    assert classifier.hits
+
+def test_classify_matches_reference_on_anchored_patterns():
+    keys = [
+        "CrtColumn.Report.Name",
+        "CrtColumn.Report.Section.Name",
+        "CrtColumn.Report.Name.Extra",
+        "CrtColumn.Report.NameX",
+        "MyCrtColumn.Report.Name",
+        "CrtColumn.Report.Description.Extra",
+        "CrtLayoutSection.Report.Header",
+        "XCrtLayoutSection.Report.Header",
+        "CrtLayoutSection",
+        "CustomApp.Sales.Description",
+        "CustomApp.Sales",
+        "CustomApp",
+        "Account.CrtColumn.Report.Name",
+    ]
+    assert_same_classification(load_metadata_types(), keys)
+
+def test_classify_matches_reference_with_literals_in_middle_components():
+    keys = [
+        "Account.CustomField.Status.FieldLabel",
+        "Account.Flow.Screen.Name",
+        "Report.CrtColumn.Main.Status",
+        "Layout.PicklistValue.Main.Label",
+        "Layout.Main.PicklistValue.Label",
+        "Account.Main.Status",
+        "Account.Main.Status",
+        "Account.Name.Main.Name",
+        "Account.CustomLabel.Description",
+    ]
+    assert_same_classification(load_metadata_types(), keys)
+
+def test_classify_matches_reference_on_single_component_keys():
+    metadata_types = load_metadata_types()
+    keys = get_literals(metadata_types) + ["", "Account", "PicklistValues", "MyWebTab", "CustomLabel", "QuickAction"]
+    assert_same_classification(metadata_types, keys)
+
+def test_classify_matches_reference_without_shape_cache():
+    metadata_types = {"Custom.Status": r"Account\.[A-Z]\w*\.Status", **load_metadata_types()}
+    classifier = LabelTypeClassifier(metadata_types)
+    assert not classifier.use_shape_cache
+    assert_same_classification(metadata_types, generate_keys(metadata_types, 5000, seed=1) + ["Account.Main.Status", "Account.main.Status"])
@@ -0,0 +1,74 @@
+import asyncio
+import io
+import json
+import pytest
+from modules.request_packing import create_packed_request
+from modules import realtime
+from modules.generate_batch_input import create_request
+from modules.realtime import RealtimeTranslator, choose_translation_mode
+
+LABELS = {"es:request-1": "Account name", "es:request-2": "Industry"}
+
+class FakeTranslator(RealtimeTranslator):
+    def __init__(self, packed_body):
+        super().__init__()
+        self.packed_body = packed_body
+        self.sent_ids = []
+
+    async def send(self, request):
+        self.sent_ids.append(request["custom_id"])
+        if request["custom_id"] == "es:packed-1":
+            return self.packed_body
+        label = request["body"]["messages"][-1]["content"]
+        return {"choices": [{"message": {"role": "assistant", "content": f"[es] {label}"}, "finish_reason": "stop"}]}
+
+def translate(packed_body):
+    translator = FakeTranslator(packed_body)
+    output_file = io.StringIO()
+    succeeded_ids = set()
+    asyncio.run(translator.translate(create_packed_request(LABELS, "es:packed-1"), output_file, succeeded_ids))
+    return translator, [json.loads(line) for line in output_file.getvalue().splitlines()], succeeded_ids
+
+@pytest.mark.parametrize("packed_body", [
+    {"choices": [{"message": {"role": "assistant"}, "finish_reason": "stop"}]},
+    {"choices": []},
+    {},
+    {"choices": [{"message": {"role": "assistant", "content": "{\"es:request-1\": "}, "finish_reason": "length"}]},
+])
+def test_unusable_packed_response_is_sent_as_single_requests(packed_body):
+    translator, outputs, succeeded_ids = translate(packed_body)
+    assert translator.sent_ids == ["es:packed-1", "es:request-1", "es:request-2"]
+    assert [output["custom_id"] for output in outputs] == ["es:request-1", "es:request-2"]
+    assert succeeded_ids == set(LABELS)
+
+def test_missing_packed_ids_are_sent_as_single_requests():
+    content = json.dumps({"es:request-1": "Nombre de la cuenta"})
+    translator, outputs, succeeded_ids = translate({"choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]})
+    assert translator.sent_ids == ["es:packed-1", "es:request-2"]
+    assert [output["custom_id"] for output in outputs] == ["es:request-2", "es:packed-1"]
+    assert succeeded_ids == set(LABELS)
+
+def write_part(path, request_count):
+    with open(path, "w", encoding="utf-8") as file:
+        for index in range(request_count):
+            file.write(json.dumps(create_request("Industry", f"es:request-{index}")) + "\n")
+    return str(path)
+
+def test_choose_translation_mode_stops_counting_above_realtime_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(realtime, "TRANSLATION_MODE", "auto")
+    monkeypatch.setattr(realtime, "REALTIME_MAX_REQUESTS_INT", 2)
+    monkeypatch.setattr(realtime, "TRANSLATION_DEADLINE_MINUTES_INT", 0)
+    unreadable_part = tmp_path / "batch_part_2.jsonl"
+    unreadable_part.write_text("no es json\n", encoding="utf-8")
+    assert choose_translation_mode([write_part(tmp_path / "batch_part_1.jsonl", 3), str(unreadable_part)]) == "batch"
+
+def test_choose_translation_mode_counts_every_request_with_deadline(tmp_path, monkeypatch):
+    monkeypatch.setattr(realtime, "TRANSLATION_MODE", "auto")
+    monkeypatch.setattr(realtime, "REALTIME_MAX_REQUESTS_INT", 2)
+    monkeypatch.setattr(realtime, "TRANSLATION_DEADLINE_MINUTES_INT", 1)
+    monkeypatch.setattr(realtime, "BATCH_EXPECTED_MINUTES_INT", 60)
+    monkeypatch.setattr(realtime, "REALTIME_REQUESTS_PER_MINUTE_INT", 10)
+    file_parts = [write_part(tmp_path / "batch_part_1.jsonl", 6), write_part(tmp_path / "batch_part_2.jsonl", 6)]
+    assert choose_translation_mode(file_parts) == "batch"
+    monkeypatch.setattr(realtime, "REALTIME_REQUESTS_PER_MINUTE_INT", 12)
+    assert choose_translation_mode(file_parts) == "realtime"
@@ -0,0 +1,35 @@
+import json
+import pytest
+from modules.generate_batch_input import RequestSerializer, create_request, estimate_request_tokens
+
+LABELS = [
+    "Industry segment",
+    "",
+    "Texto con \"comillas\" y 'apóstrofos'",
+    "Ruta C:\\Users\\admin\\ y \\n literal",
+    "Línea 1\nLínea 2\r\n\tTabulada",
+    "Controles \x00\x01\x08\x0b\x0c\x1f\x7f",
+    "Separadores \u2028 de línea \u2029 y párrafo",
+    "Emoji 😀 y ideograma 𠜎 fuera del BMP",
+    "Sustituto suelto \ud800",
+    "{!Account.Name} <b>negrita</b> & </script>",
+]
+CUSTOM_IDS = ["es:request-1", "fr:packed-2-7", "id \"raro\" \\ \u2028 😀"]
+
+@pytest.mark.parametrize("label", LABELS)
+@pytest.mark.parametrize("custom_id", CUSTOM_IDS)
+def test_serialize_matches_json_dumps(label, custom_id):
+    serializer = RequestSerializer()
+    line, _, _ = serializer.serialize(label, custom_id)
+    assert line == json.dumps(create_request(label, custom_id), ensure_ascii=False) + "\n"
+
+@pytest.mark.parametrize("label", LABELS)
+def test_serialize_matches_json_dumps_with_custom_request_parameters(label):
+    model = "gpt-4o-mini"
+    prompt = "Traduce \"esto\" \\ sin cambiar\n\u2028 😀"
+    serializer = RequestSerializer(model, prompt, 37)
+    line, input_tokens, output_tokens = serializer.serialize(label, "es:request-5")
+    request = create_request(label, "es:request-5", model, prompt, 37)
+    assert line == json.dumps(request, ensure_ascii=False) + "\n"
+    assert json.loads(line) == request
+    assert (input_tokens, output_tokens) == estimate_request_tokens(request)